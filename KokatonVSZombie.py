@@ -1,12 +1,43 @@
+import time
+IMPORT_START = time.perf_counter()  # 起動時間の計測の起点（pygameの読み込みも含める）
 import pygame
 import sys
 import os
 import random
-import time
+import functools
+import collections
+import csv
+import json
+import argparse
+import dataclasses
+import itertools
+import threading
+import struct
+import hashlib
+import heapq
+import math
+from bisect import bisect_left
+
+class StartupTimer:
+    """起動（このモジュールの読み込みの開始）から最初のタイトル画面までの時間を区間ごとに記録する"""
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start  # 起動した時刻（perf_counter）
+        self.marks = []  # (区間名, 起動からの経過時間（秒）)
+
+    def mark(self, name):
+        """区間nameが終わった時刻を記録する"""
+        self.marks.append((name, time.perf_counter() - self.start))
+
+    def report(self):
+        """区間ごとの時間と累計をミリ秒で表にした文字列を返す"""
+        lines = []
+        previous = 0.0
+        for name, elapsed in self.marks:
+            lines.append(f"{name:<20}{(elapsed - previous) * 1000:8.1f} ms  (total {elapsed * 1000:8.1f} ms)")
+            previous = elapsed
+        return "\n".join(lines)
 
-# Pygameの初期化
-pygame.init()
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+startup = StartupTimer(IMPORT_START)
 
 # 画面サイズとマス目サイズの設定
 GRID_ROWS = 5  # マスの行数
@@ -27,59 +58,198 @@ RED = (255, 0, 0)  # 敵ゾンビの色
 BLUE = (0, 0, 255)  # 弾の色
 HP_GREEN = (0, 255, 0)  # HPバーの色
 
-# 画面の作成
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Plants vs Zombies 風ゲーム")
+class App:
+    """
+    pygameの初期化・ウィンドウ・フォントをまとめたもの
+    importしただけでは作られず、get_app()で最初に必要になったときに作る
+    """
+    def __init__(self):
+        # Pygameの初期化
+        pygame.init()
+        startup.mark("pygame_init")
+        # 画面の作成
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Plants vs Zombies 風ゲーム")
+        restrict_events()  # キューが空のうちに使うイベントだけに絞る（絞るときにキューの中身は消える）
+        startup.mark("display")
+        # フォントの設定
+        self.font = pygame.font.Font(None, 36)
+        startup.mark("fonts")
 
-# フォントの設定
-font = pygame.font.Font(None, 36)
+_app = None
 
-# 画像の読み込みと反転
-current_path = os.path.dirname(__file__)  # カレントディレクトリ
-plant_image = pygame.image.load(os.path.join(current_path, "fig", "7.png"))  # 植物画像
-plant_image = pygame.transform.flip(plant_image, True, False)
-plant_image = pygame.transform.scale(plant_image, (50, 75))  # サイズ調整
+def get_app():
+    """Appを返す（まだなければ作る）"""
+    global _app
+    if _app is None:
+        _app = App()
+    return _app
+
+# 画像アセットの管理
+class AssetRegistry:
+    """
+    fig/以下の画像を一度だけ読み込み、拡大縮小・反転済みのSurfaceを保持する
+    キーは（ファイル名, サイズ, 反転, 倍率）
+    """
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self._raw = {}  # ファイル名 -> 読み込んだままのSurface
+        self._cache = {}  # キー -> 加工済みSurface
+        self.hits = 0  # キャッシュから返した回数
+        self.misses = 0  # 新しく加工した回数
+        self.load_time = 0.0  # 読み込みと加工にかかった合計時間（秒）
+
+    def _load_raw(self, name):
+        """画像ファイルをディスクから読み込む（ファイルごとに1回だけ）"""
+        image = self._raw.get(name)
+        if image is None:
+            image = pygame.image.load(os.path.join(self.base_dir, name))
+            self._raw.setdefault(name, image)
+        return image
+
+    def preload_async(self, names):
+        """
+        画像ファイルの読み込みだけを別スレッドで先に済ませておく
+        （拡大縮小と画面形式への変換は、最初にget()したときにメインスレッドで行う）
+        """
+        def load_all():
+            for name in names:
+                if name not in self._raw:
+                    self._load_raw(name)
+        thread = threading.Thread(target=load_all, name="asset-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def get(self, name, size=None, flip=False, zoom=None):
+        """
+        加工済みの画像を返す
+        引数 size：拡大縮小後のサイズ、flip：左右反転するか、zoom：rotozoomの倍率
+        """
+        key = (name, size, flip, zoom)
+        image = self._cache.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+        self.misses += 1
+        start = time.perf_counter()
+        image = self._load_raw(name)
+        if flip:
+            image = pygame.transform.flip(image, True, False)
+        if size is not None:
+            image = pygame.transform.scale(image, size)
+        if zoom is not None:
+            image = pygame.transform.rotozoom(image, 0, zoom)
+        if pygame.display.get_surface() is not None:  # 画面があるときだけ画面形式に変換
+            image = image.convert_alpha()
+        self._cache[key] = image
+        self.load_time += time.perf_counter() - start
+        return image
 
-plant_image2 = pygame.image.load(os.path.join(current_path, "fig", "1.png"))  # 植物画像
-plant_image2 = pygame.transform.flip(plant_image2, True, False)
-plant_image2 = pygame.transform.scale(plant_image2, (50, 75))  # サイズ調整
+    def stats(self):
+        """ヒット数・ミス数・読み込み時間を返す"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "load_time_ms": self.load_time * 1000,
+            "cached": len(self._cache),
+        }
+
+# 画像の読み込みと反転
+current_path = os.path.dirname(os.path.abspath(__file__))  # このファイルのあるディレクトリ
+assets = AssetRegistry(os.path.join(current_path, "fig"))
+ZOMBIE_IMAGE_SIZE = (75, 95)  # ゾンビ画像の表示サイズ
+PLANT_IMAGE_SIZE = (50, 75)  # 植物画像の表示サイズ
+SCOP_IMAGE_SIZE = (48, 64)  # scop画像の表示サイズ
+# assets.get()に渡す（ファイル名, サイズ, 反転）
+PLANT_IMAGE = ("7.png", PLANT_IMAGE_SIZE, True)  # 植物画像
+PLANT_WALL_IMAGE = ("1.png", PLANT_IMAGE_SIZE, True)  # 植物画像
+SCOP_IMAGE = ("scop.png", SCOP_IMAGE_SIZE, False)  # scop画像
+# ゲーム画面で使う画像ファイル（タイトル画面の間に読み込んでおく）
+GAME_IMAGE_FILES = ("7.png", "1.png", "scop.png", "zombie_image_1.png", "zombie_image_2.png", "zombie_image_3.png")
 
 # moneyの初期値と回復設定
-money = 100
+INITIAL_MONEY = 100
 money_increase_interval = 2000  # moneyが増える間隔（ミリ秒）
 money_increase_amount = 10  # 増える金額
-last_money_update = pygame.time.get_ticks()  # 最後にmoneyを増やした時間
 
 # 弾の攻撃力
 BULLET_DAMAGE = 5
 BULLET_SPEED = 5
+SHOOT_INTERVAL = 2000  # 植物が弾を撃つ間隔（ミリ秒）
+CONTACT_DAMAGE = 0.3  # ゾンビが接触中の植物に毎ステップ与えるダメージ
+CLEAR_SCORE = 1000000  # scoreがこれを超えるとクリア
 
 # ゾンビの出現管理
 zombie_spawn_interval = 5000  # 5秒ごとにゾンビを出現
-last_zombie_spawn = pygame.time.get_ticks()
-
-# HPバーを描画する関数
-def draw_hp_bar(surface, rect, hp, max_hp):
-    """HPバーを描画"""
-    bar_width = rect.width
-    bar_height = 6
-    hp_ratio = hp / max_hp
-    hp_width = int(bar_width * hp_ratio)
-
-    # HPバーの背景（赤）
-    pygame.draw.rect(surface, RED, (rect.x, rect.y - bar_height - 2, bar_width, bar_height))
-    # 現在のHP（緑）
-    if hp > 0:
-        pygame.draw.rect(surface, HP_GREEN, (rect.x, rect.y - bar_height - 2, hp_width, bar_height))
+
+# ゾンビの種類（速度、HP、画像）
+ZOMBIE_KINDS = {
+    "normal": (2, 30, "zombie_image_2.png"),  # 通常ゾンビ
+    "fast": (4, 10, "zombie_image_1.png"),  # 足早+耐久低ゾンビ
+    "tank": (1, 60, "zombie_image_3.png"),  # 足遅+耐久高ゾンビ
+}
+
+# ゾンビ・植物の当たり判定の大きさ
+ENTITY_SIZE = (50, 75)
+_serial = itertools.count()  # 生成順の通し番号（同時に当たったときの優先順位に使う）
+
+def lane_of(y):
+    """y座標から何行目（レーン）かを返す"""
+    return (y - INFO_AREA_HEIGHT) // GRID_SIZE
+
+def interpolated_rect(rect, prev_x, alpha):
+    """1ステップ前のx座標と現在のrectの間をalphaで補間したRectを返す"""
+    if alpha >= 1.0 or prev_x == rect.x:
+        return rect
+    return rect.move(round((prev_x - rect.x) * (1.0 - alpha)), 0)
+
+HP_BAR_HEIGHT = 6  # HPバーの高さ
+BULLET_RADIUS = 5  # 弾の半径
+
+def _display_format(surface, alpha=False):
+    """画面があれば画面の形式に変換する（描画が速くなる）"""
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert_alpha() if alpha else surface.convert()
+
+@functools.lru_cache(maxsize=None)
+def hp_bar_image(bar_width, hp_width):
+    """幅bar_widthのうち左からhp_width（ピクセル）が緑のHPバーの画像（HPの割合をピクセル単位で量子化して使い回す）"""
+    bar = pygame.Surface((bar_width, HP_BAR_HEIGHT))
+    bar.fill(RED)  # HPバーの背景（赤）
+    if hp_width > 0:
+        bar.fill(HP_GREEN, (0, 0, hp_width, HP_BAR_HEIGHT))  # 現在のHP（緑）
+    return _display_format(bar)
+
+def hp_bar_sprite(rect, hp, max_hp):
+    """rectの上に描くHPバーの(画像, 位置)"""
+    hp_width = int(rect.width * hp / max_hp) if hp > 0 else 0
+    return hp_bar_image(rect.width, hp_width), (rect.x, rect.y - HP_BAR_HEIGHT - 2)
+
+def hp_bar_stats():
+    """HPバーの画像キャッシュの統計"""
+    info = hp_bar_image.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "cached": info.currsize}
+
+@functools.lru_cache(maxsize=None)
+def bullet_image():
+    """弾の画像（円を一度だけ描いておく）"""
+    image = pygame.Surface((BULLET_RADIUS * 2, BULLET_RADIUS * 2), pygame.SRCALPHA)
+    pygame.draw.circle(image, BLUE, (BULLET_RADIUS, BULLET_RADIUS), BULLET_RADIUS)
+    return _display_format(image, alpha=True)
 
 # ゾンビクラスの定義
 class Zombie:
     """ゾンビの設定"""
+    __slots__ = ("rect", "prev_x", "lane", "serial", "image", "speed", "initial_speed", "hp", "max_hp", "alive",
+                 "attacking")
+
     def __init__(self, x, y, speed, hp, zombie_image_path):
-        self.rect = pygame.Rect(x, y, 50, 75)
-        self.image = pygame.image.load(os.path.join(current_path, "fig", zombie_image_path))  # ゾンビ画像
-        self.image = pygame.transform.scale(self.image, (75, 95))
-        self.image = pygame.transform.flip(self.image, True, False)
+        self.rect = pygame.Rect((x, y), ENTITY_SIZE)
+        self.prev_x = x  # 1ステップ前のx座標（描画の補間に使う）
+        self.lane = lane_of(y)
+        self.serial = next(_serial)
+        self.image = zombie_image_path  # ゾンビ画像のファイル名（描画時にassetsから取り出す）
         self.speed = speed
         self.initial_speed = speed  # 元の速度を保存
         self.hp = hp  # ゾンビのHP
@@ -88,6 +258,8 @@ class Zombie:
         self.attacking = False  # 攻撃中フラグ
 
     def move(self):
+        """1ステップ分（speedピクセル）左に移動"""
+        self.prev_x = self.rect.x
         if self.alive and not self.attacking:  # 攻撃中でない場合に移動
             self.rect.x -= self.speed
         else:  # 攻撃中は速度を保持するが移動しない
@@ -104,10 +276,15 @@ class Zombie:
         """速度を元に戻す"""
         self.speed = self.initial_speed
 
-    def draw(self, surface):
+    def draw(self, batch, alpha=1.0):
+        """
+        描画する(画像, 位置)をbatchに加える
+        引数 alpha：1ステップ前の位置(0)から現在の位置(1)までのどこに描くか
+        """
         if self.alive:
-            surface.blit(self.image, self.rect.topleft)
-            draw_hp_bar(surface, self.rect, self.hp, self.max_hp)
+            rect = interpolated_rect(self.rect, self.prev_x, alpha)
+            batch.append((assets.get(self.image, ZOMBIE_IMAGE_SIZE, flip=True), rect.topleft))
+            batch.append(hp_bar_sprite(rect, self.hp, self.max_hp))
 
     def is_off_screen(self):
         """ゾンビが左端を通過したかを判定"""
@@ -115,12 +292,17 @@ class Zombie:
     
 # 植物クラスの定義
 class Plant:
-    def __init__(self, x, y, hp):
-        self.rect = pygame.Rect(x, y, 50, 75)
+    __slots__ = ("rect", "lane", "serial", "hp", "max_hp", "alive", "last_shot_time")
+    shoot_interval = SHOOT_INTERVAL  # 弾を撃つ間隔（ミリ秒）
+
+    def __init__(self, x, y, hp, now=0):
+        self.rect = pygame.Rect((x, y), ENTITY_SIZE)
+        self.lane = lane_of(y)
+        self.serial = next(_serial)
         self.hp = hp  # 植物のHP
         self.max_hp = hp
         self.alive = True
-        self.last_shot_time = pygame.time.get_ticks()
+        self.last_shot_time = now  # 設置した時刻（ミリ秒）
 
     def take_damage(self, damage):
         """ダメージを受ける"""
@@ -128,28 +310,32 @@ class Plant:
         if self.hp <= 0:
             self.alive = False
 
-    def shoot(self, zombies):
-        """2秒間隔で弾を発射"""
-        for zombie in zombies:
-            if zombie.alive and zombie.rect.y == self.rect.y:
-                current_time = pygame.time.get_ticks()
-                if current_time - self.last_shot_time >= 2000:  # 2秒間隔
-                    self.last_shot_time = current_time
-                    return Bullet(self.rect.right, self.rect.centery)
-        return None
+    def shoot(self, pool, current_time):
+        """
+        弾を発射する（弾はpoolから取り出す）
+        撃つかどうか（間隔が空いていて同じレーンにゾンビがいるか）はSimulationのSchedulerが決める
+        """
+        self.last_shot_time = current_time
+        return pool.acquire(self.rect.right, self.rect.centery)
 
-    def draw(self, surface):
+    def draw(self, batch, alpha=1.0):
+        """描画する(画像, 位置)をbatchに加える（植物は動かないのでalphaは使わない）"""
         if self.alive:
-            surface.blit(plant_image, self.rect.topleft)
-            draw_hp_bar(surface, self.rect, self.hp, self.max_hp)
+            batch.append((assets.get(*PLANT_IMAGE), self.rect.topleft))
+            batch.append(hp_bar_sprite(self.rect, self.hp, self.max_hp))
 
 class Plant_wall:
-    def __init__(self, x, y, hp):
-        self.rect = pygame.Rect(x, y, 50, 75)
+    __slots__ = ("rect", "lane", "serial", "hp", "max_hp", "alive", "last_shot_time")
+    shoot_interval = None  # 弾を撃たない
+
+    def __init__(self, x, y, hp, now=0):
+        self.rect = pygame.Rect((x, y), ENTITY_SIZE)
+        self.lane = lane_of(y)
+        self.serial = next(_serial)
         self.hp = hp  # 植物のHP
         self.max_hp = hp
         self.alive = True
-        self.last_shot_time = pygame.time.get_ticks()
+        self.last_shot_time = now  # 設置した時刻（ミリ秒）
 
     def take_damage(self, damage):
         """ダメージを受ける"""
@@ -157,52 +343,994 @@ class Plant_wall:
         if self.hp <= 0:
             self.alive = False
 
-    def shoot(self, zombies):
-        pass
-
-    def draw(self, surface):
+    def draw(self, batch, alpha=1.0):
+        """描画する(画像, 位置)をbatchに加える（植物は動かないのでalphaは使わない）"""
         if self.alive:
-            surface.blit(plant_image2, self.rect.topleft)
-            draw_hp_bar(surface, self.rect, self.hp, self.max_hp)
+            batch.append((assets.get(*PLANT_WALL_IMAGE), self.rect.topleft))
+            batch.append(hp_bar_sprite(self.rect, self.hp, self.max_hp))
+
+def _overlapping(items, xs, left, right):
+    """
+    x座標順に並んだitemsのうち、x方向に[left, right)と重なるものを返す
+    引数 xs：itemsのx座標のリスト（昇順）
+    """
+    lo = bisect_left(xs, left - ENTITY_SIZE[0] + 1)
+    hi = bisect_left(xs, right, lo)
+    return items[lo:hi]
+
+class LaneIndex:
+    """
+    レーン（行）ごとにゾンビをx座標順に並べて持つ索引
+    植物の攻撃対象探しと弾の当たり判定は、全体ではなく同じレーンの近くにいるゾンビだけを調べる
+    （植物はBoardのマスから直接引く）
+    """
+    def __init__(self, rows):
+        self.zombies = [[] for _ in range(rows)]
+        self.zombie_xs = [[] for _ in range(rows)]
+
+    def rebuild(self, zombies):
+        """生きているゾンビをレーンごとに振り分けてx座標順に並べる"""
+        for lane in self.zombies:
+            lane.clear()
+        for zombie in zombies:
+            if zombie.alive:
+                self.zombies[zombie.lane].append(zombie)
+        for lane, lane_xs in zip(self.zombies, self.zombie_xs):
+            lane.sort(key=lambda zombie: zombie.rect.x)  # ほぼ整列済みなのでほぼ線形時間
+            lane_xs[:] = [zombie.rect.x for zombie in lane]
+
+    def has_zombie(self, lane):
+        """レーンに生きているゾンビがいるか"""
+        return any(zombie.alive for zombie in self.zombies[lane])
+
+    def zombie_hit_by(self, rect, lane):
+        """rectに当たっている生きたゾンビのうち、最も先に出現したものを返す"""
+        hit = None
+        for zombie in _overlapping(self.zombies[lane], self.zombie_xs[lane], rect.left, rect.right):
+            if zombie.alive and (hit is None or zombie.serial < hit.serial):
+                hit = zombie
+        return hit
+
+class Board:
+    """
+    GRID_ROWS×GRID_COLUMNSのマスごとに置いてある植物を持つ盤面
+    1マスに置ける植物は1つだけで、設置できるか・scopで取り除く植物・
+    ゾンビが接触している植物をマスから直接O(1)で引く
+    """
+    def __init__(self, rows=GRID_ROWS, columns=GRID_COLUMNS):
+        self.cells = [[None] * columns for _ in range(rows)]
+        self.counts = [0] * rows  # 行ごとの植物の数
+
+    def get(self, row, col):
+        """row行col列の生きた植物（なければNone）"""
+        plant = self.cells[row][col]
+        return plant if plant is not None and plant.alive else None
+
+    def put(self, row, col, plant):
+        """row行col列に植物を置く"""
+        self.cells[row][col] = plant
+        self.counts[row] += 1
+
+    def remove(self, plant):
+        """植物をマスから外す"""
+        row, col = plant.lane, (plant.rect.x - GRID_OFFSET_X) // GRID_SIZE
+        if self.cells[row][col] is plant:
+            self.cells[row][col] = None
+            self.counts[row] -= 1
+
+    def plants_touching(self, rect, lane):
+        """rectにx方向で重なる生きた植物を設置順に返す（調べるのは重なりうる高々2マス）"""
+        if not self.counts[lane]:
+            return []
+        # 植物の左端が[rect.left - 植物の幅 + 1, rect.right)にある列
+        first = max(0, -((GRID_OFFSET_X - rect.left + ENTITY_SIZE[0] - 1) // GRID_SIZE))
+        last = min(len(self.cells[lane]), -((GRID_OFFSET_X - rect.right) // GRID_SIZE))
+        if first >= last:
+            return []
+        touching = [plant for plant in self.cells[lane][first:last] if plant is not None and plant.alive]
+        if len(touching) > 1:
+            touching.sort(key=lambda plant: plant.serial)
+        return touching
 
 # 弾クラスの定義
 class Bullet:
+    __slots__ = ("rect", "prev_x", "lane", "alive")
+
     def __init__(self, x, y):
         self.rect = pygame.Rect(x, y, 10, 10)
+        self.prev_x = x
+        self.lane = lane_of(y)
+        self.alive = True
+
+    def reset(self, x, y):
+        """再利用するときに位置と状態を初期化する"""
+        self.rect.x = x
+        self.rect.y = y
+        self.prev_x = x
+        self.lane = lane_of(y)
+        self.alive = True
 
     def move(self):
-        """弾を右方向に移動"""
+        """弾を1ステップ分右方向に移動"""
+        self.prev_x = self.rect.x
         self.rect.x += BULLET_SPEED
 
-    def draw(self, surface):
-        pygame.draw.circle(surface, BLUE, self.rect.center, 5)
+    def draw(self, batch, alpha=1.0):
+        """描画する(画像, 位置)をbatchに加える"""
+        x, y = interpolated_rect(self.rect, self.prev_x, alpha).center
+        batch.append((bullet_image(), (x - BULLET_RADIUS, y - BULLET_RADIUS)))
 
-def draw_title(screen: pygame.Surface):
+class BulletPool:
+    """使い終わった弾を捨てずに取っておき、次の発射で再利用する"""
+    def __init__(self):
+        self._free = []
+        self.created = 0  # 新しく作った弾の数
+        self.reused = 0  # 再利用した弾の数
+
+    def acquire(self, x, y):
+        """(x, y)に弾を用意して返す"""
+        if self._free:
+            bullet = self._free.pop()
+            bullet.reset(x, y)
+            self.reused += 1
+        else:
+            bullet = Bullet(x, y)
+            self.created += 1
+        return bullet
+
+    def release(self, bullet):
+        """使い終わった弾を返す"""
+        self._free.append(bullet)
+
+class EntityStore:
     """
-    タイトル画面を表示する関数
-    引数1 screen：画面Surface
+    ゾンビ・植物・弾を出現順に保持するリスト
+    倒されたものはdiscard()で印を付けるだけ（O(1)）にしておき、
+    フレームの最後のsweep()でまとめて詰めて取り除く
+    """
+    __slots__ = ("items", "_dead")
+
+    def __init__(self):
+        self.items = []
+        self._dead = 0  # 印を付けたまま残っている数
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, entity):
+        """エンティティを追加する"""
+        self.items.append(entity)
+
+    def discard(self, entity):
+        """エンティティを無効にし、次のsweep()で取り除かれるようにする"""
+        if entity.alive:
+            entity.alive = False
+        self._dead += 1
+
+    def sweep(self, release=None):
+        """
+        無効になったエンティティを順番を保ったまま詰めて取り除く
+        引数 release：取り除いたエンティティを受け取る関数（弾をプールに戻すときなど）
+        """
+        if not self._dead:
+            return
+        items = self.items
+        kept = 0
+        for entity in items:
+            if entity.alive:
+                items[kept] = entity
+                kept += 1
+            elif release is not None:
+                release(entity)
+        del items[kept:]
+        self._dead = 0
+
+# 1フレームの中で処理時間を計る区間（トレースファイルの列の順番）
+PROFILE_PHASES = (
+    "events",  # 入力イベントの処理
+    "timers",  # moneyの増加とゾンビの出現
+    "lane_index",  # レーンごとの索引の作り直し
+    "shoot",  # 植物の発射（Schedulerで撃つ時刻になった攻撃こうかとんだけ）
+    "bullets",  # 弾の移動と当たり判定
+    "contact",  # ゾンビと植物の接触判定
+    "zombies",  # ゾンビの移動と陣地への侵入判定
+    "sweep",  # 倒されたものの片付け
+    "draw_background",  # 背景と情報エリア
+    "draw_entities",  # ゾンビ・植物・弾
+    "draw_overlay",  # ドラッグ中のアイテムと計測結果の表示
+    "display_update",  # pygame.display.update
+)
+
+class _NullPhase:
+    """計測しないときに使う何もしないwithブロック"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _NullProfiler:
+    """計測を無効にしたときのプロファイラ（ほぼコストなし）"""
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def end_frame(self, counts=None):
+        pass
+
+    def close(self):
+        pass
+
+NULL_PROFILER = _NullProfiler()
+
+class _Phase:
+    """1つの区間の開始と終了の時刻を計るwithブロック"""
+    __slots__ = ("times", "name", "start")
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.times[self.name] += time.perf_counter() - self.start
+        return False
+
+# トレースに書き出す1フレームごとの数（エンティティ数と描画の回数）
+TRACE_COUNTS = ("zombies", "plants", "bullets", "draw_calls", "sprites")
+
+def default_counter_sources():
+    """プロファイラに表示するキャッシュの統計"""
+    return {"assets": assets.stats, "text_cache": text_cache.stats, "hp_bars": hp_bar_stats}
+
+class FrameProfiler:
+    """
+    1フレームの区間ごとの処理時間とエンティティ数を記録する
+    直近windowフレームの平均とp99を計算でき、trace_pathを渡すと
+    1フレーム1行でCSV（拡張子.csv）またはJSON Linesに書き出す
+    """
+    enabled = True
+
+    def __init__(self, window=300, trace_path=None, sources=None):
+        self.sources = sources if sources is not None else default_counter_sources()  # 名前 -> 統計を返す関数
+        self._times = dict.fromkeys(PROFILE_PHASES, 0.0)  # このフレームの区間ごとの時間（秒）
+        self._phases = {name: _Phase(self._times, name) for name in PROFILE_PHASES}
+        self.history = {name: collections.deque(maxlen=window) for name in PROFILE_PHASES + ("frame",)}
+        self.counts = {}  # 直近のフレームのエンティティ数
+        self.frames = 0
+        self._frame_start = time.perf_counter()
+        self._trace = None
+        self._writer = None
+        if trace_path is not None:
+            self._trace = open(trace_path, "w", newline="", encoding="utf-8")
+            if trace_path.endswith(".csv"):
+                self._writer = csv.writer(self._trace)
+                self._writer.writerow(("frame", "frame_ms") + tuple(f"{name}_ms" for name in PROFILE_PHASES)
+                                      + TRACE_COUNTS)
+
+    def phase(self, name):
+        """区間nameの時間を計るwithブロックを返す"""
+        return self._phases[name]
+
+    def end_frame(self, counts=None):
+        """フレームの終わりに呼び、区間ごとの時間を記録してリセットする"""
+        now = time.perf_counter()
+        frame_time = now - self._frame_start
+        self._frame_start = now
+        self.frames += 1
+        times = self._times
+        for name, value in times.items():
+            self.history[name].append(value)
+        self.history["frame"].append(frame_time)
+        if counts is not None:
+            self.counts = counts
+        if self._trace is not None:
+            counts = self.counts
+            if self._writer is not None:
+                self._writer.writerow([self.frames, round(frame_time * 1000, 4)]
+                                      + [round(times[name] * 1000, 4) for name in PROFILE_PHASES]
+                                      + [counts.get(name, 0) for name in TRACE_COUNTS])
+            else:
+                row = {"frame": self.frames, "frame_ms": frame_time * 1000}
+                row.update((f"{name}_ms", value * 1000) for name, value in times.items())
+                row.update(counts)
+                self._trace.write(json.dumps(row) + "\n")
+        for name in times:
+            times[name] = 0.0
+
+    def stats(self):
+        """区間ごとの直近の平均とp99（ミリ秒）を返す"""
+        result = {}
+        for name, samples in self.history.items():
+            if samples:
+                ordered = sorted(samples)
+                result[name] = (sum(ordered) / len(ordered) * 1000,
+                                ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000)
+        return result
+
+    def counters(self):
+        """キャッシュなどの統計（ヒット数・ミス数など）を集めて返す"""
+        return {name: source() for name, source in self.sources.items()}
+
+    def close(self):
+        """トレースファイルを閉じる"""
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+# 植物の種類（クラス、値段、HP）
+PLANT_KINDS = {
+    "shooter": (Plant, 50, 100),  # 攻撃こうかとん
+    "wall": (Plant_wall, 10, 300),  # 守りこうかとん
+}
+
+# 決まった時刻に出すゾンビの群れ（at：出す時刻（ミリ秒）、row：Noneなら1体ごとに乱数で行を決める）
+Wave = collections.namedtuple("Wave", "at kind count row", defaults=(1, None))
+
+@dataclasses.dataclass
+class Rules:
+    """ゲームの難易度に関わるパラメータ"""
+    initial_money: int = INITIAL_MONEY
+    money_increase_interval: float = money_increase_interval
+    money_increase_amount: int = money_increase_amount
+    zombie_spawn_interval: float = zombie_spawn_interval
+    # randint(0, 合計-1)の目の数で各ゾンビの出やすさを表す（初期値は50%/25%/25%）
+    zombie_weights: tuple = (("normal", 51), ("fast", 25), ("tank", 25))
+    bullet_damage: int = BULLET_DAMAGE
+    zombies_per_spawn: int = 1  # 1回の出現で出すゾンビの数
+    clear_score: int = CLEAR_SCORE  # Noneならクリアしない（エンドレス）
+    lose_on_breach: bool = True  # Falseなら陣地に入ったゾンビは消えるだけでゲームオーバーにならない
+    waves: tuple = ()  # 定期的な出現とは別に決まった時刻に出すゾンビ（Waveのタプル）
+
+def wave_timeline(rules):
+    """rules.wavesを出す時刻の順に並べる（同じ時刻なら書いた順）"""
+    return sorted(rules.waves, key=lambda wave: wave.at)
+
+def wave_zombies(rng, wave):
+    """waveで出すゾンビの(種類, 行)のリスト（行を決めない群れは1体ごとに乱数で決める）"""
+    return [(wave.kind, wave.row if wave.row is not None else rng.randint(0, GRID_ROWS - 1))
+            for _ in range(wave.count)]
+
+def endless_rules(zombie_spawn_interval=250, zombies_per_spawn=20):
+    """
+    エンドレス（負荷試験）用のルール
+    クリアもゲームオーバーもなく、大量のゾンビが出続ける
+    """
+    return Rules(zombie_spawn_interval=zombie_spawn_interval, zombies_per_spawn=zombies_per_spawn,
+                 clear_score=None, lose_on_breach=False)
+
+def pick_zombie_kind(rng, weights):
+    """出現確率に従ってゾンビの種類を選ぶ（randintを1回だけ使う）"""
+    random_zombie = rng.randint(0, sum(weight for _, weight in weights) - 1)
+    for kind, weight in weights:
+        if random_zombie < weight:
+            return kind
+        random_zombie -= weight
+    return weights[-1][0]
+
+STEP_MS = 1000 / 60  # シミュレーション1ステップの長さ（ミリ秒）
+
+class SimClock:
+    """シミュレーション内の時計。実時間ではなくステップ数から時刻を決める"""
+    def __init__(self, dt=STEP_MS):
+        self.dt = dt
+        self.ticks = 0
+
+    def now(self):
+        """現在の時刻（ミリ秒）"""
+        return self.ticks * self.dt
+
+    def advance(self):
+        """1ステップ進める"""
+        self.ticks += 1
+
+MAX_CATCH_UP_STEPS = 5  # 1フレームで遅れを取り戻すために進める最大ステップ数
+MAX_FRAME_SKIP = 5  # 遅れているときに続けて描画を飛ばす最大フレーム数
+
+class FixedStepLoop:
+    """
+    実際に経過した時間を貯めておき、STEP_MSたまるごとにシミュレーションを1ステップ進める
+    処理が重くてもゲームの速さは変わらず、間に合わないときは描画の方を飛ばす
+    1フレームで進めるのはmax_catch_upステップまでで、それ以上の遅れは捨てる
+    """
+    def __init__(self, step_ms=STEP_MS, max_catch_up=MAX_CATCH_UP_STEPS, max_frame_skip=MAX_FRAME_SKIP,
+                 time_source=None):
+        if max_catch_up < 1:
+            raise ValueError(f"max_catch_upは1以上にしてください: {max_catch_up}")  # 0だとゲームが進まない
+        self.step_ms = step_ms
+        self.max_catch_up = max_catch_up
+        self.max_frame_skip = max_frame_skip
+        self._time = time_source if time_source is not None else (lambda: time.perf_counter() * 1000)
+        self.accumulator = 0.0  # まだシミュレーションに反映していない時間（ミリ秒）
+        self._last = None
+        self._skipped = 0  # 続けて描画を飛ばしたフレーム数
+        self.skipped_frames = 0  # 描画を飛ばしたフレームの合計
+        self.dropped_ms = 0.0  # 追いつけずに捨てた時間の合計
+
+    def reset(self):
+        """貯めた時間を捨てる（タイトル画面から始めるときなど）"""
+        self.accumulator = 0.0
+        self._last = None
+
+    @property
+    def alpha(self):
+        """1ステップ前の状態から現在の状態までのどこを描くか（0〜1）"""
+        return min(self.accumulator / self.step_ms, 1.0)
+
+    def update(self, step):
+        """
+        経過時間に応じてstep()を呼ぶ
+        戻り値：このフレームを描画すべきか
+        """
+        now = self._time()
+        if self._last is None:
+            self._last = now
+        self.accumulator += now - self._last
+        self._last = now
+        steps = 0
+        while self.accumulator >= self.step_ms and steps < self.max_catch_up:
+            step()
+            self.accumulator -= self.step_ms
+            steps += 1
+        behind = self.accumulator >= self.step_ms
+        if behind and steps == self.max_catch_up:
+            # 取り戻しきれない分は捨てる（この分だけゲームが遅れる）
+            excess = self.accumulator - self.step_ms * self.max_catch_up
+            if excess > 0:
+                self.dropped_ms += excess
+                self.accumulator -= excess
+        if behind and self._skipped < self.max_frame_skip:
+            self._skipped += 1
+            self.skipped_frames += 1
+            return False
+        self._skipped = 0
+        return True
+
+# Schedulerで同じステップに起きる出来事の順番
+TIMER_MONEY = 0  # moneyの増加
+TIMER_SPAWN = 1  # 定期的なゾンビの出現
+TIMER_WAVE = 2  # 決まった時刻のゾンビの群れ
+TIMER_SHOOT = 3  # 攻撃こうかとんの発射（同じステップなら設置順）
+
+class Scheduler:
+    """
+    時間で起きる出来事を次に起きるステップ数の順に並べた優先度付きキュー
+    毎ステップ、時刻になった出来事だけを取り出すので、
+    処理の量は植物の数ではなく実際に起きる出来事の数に比例する
+    """
+    def __init__(self):
+        self._heap = []  # (ステップ数, 順番, 同じ順番の中での番号, 出来事)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, tick, order, key, event):
+        """tickステップ目にeventを起こす（同じステップではorder、keyの小さい順）"""
+        heapq.heappush(self._heap, (tick, order, key, event))
+
+    def pop_due(self, tick, last_order):
+        """tickステップ目までに起きる出来事のうち、順番がlast_order以下のものを順に取り出す"""
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= tick and heap[0][1] <= last_order:
+            due.append(heapq.heappop(heap)[3])
+        return due
+
+def due_tick(clock, since, interval):
+    """
+    clockの時刻がsinceからinterval以上たつ最初のステップ数（ただし今より前にはしない）
+    毎ステップ「現在時刻 - since >= interval」を調べるのと同じステップになる
+    """
+    if math.isinf(interval):
+        return None
+    dt = clock.dt
+    tick = max(clock.ticks, math.ceil((since + interval) / dt) - 1)
+    while tick * dt - since < interval:
+        tick += 1
+    return tick
+
+def cell_at(pos):
+    """
+    画面上の座標が何行何列のマスかを返す
+    盤面（GRID_ROWS×GRID_COLUMNS）の外ならNoneを返す
+    """
+    mouse_x, mouse_y = pos
+    if mouse_y > INFO_AREA_HEIGHT and mouse_x > GRID_OFFSET_X:
+        row = (mouse_y - INFO_AREA_HEIGHT) // GRID_SIZE
+        col = (mouse_x - GRID_OFFSET_X) // GRID_SIZE
+        if row < GRID_ROWS and col < GRID_COLUMNS:
+            return row, col
+    return None
+
+def cell_origin(row, col):
+    """row行col列のマスの左上の座標"""
+    return GRID_OFFSET_X + col * GRID_SIZE, INFO_AREA_HEIGHT + row * GRID_SIZE
+
+class Simulation:
+    """
+    描画を一切行わないゲーム本体
+    固定の時間幅でstep()を呼ぶと1フレーム分ゲームが進む
+    時計と乱数は外から渡せるので、ウィンドウなしで同じ結果を何度でも再現できる
+    """
+    def __init__(self, seed=None, rules=None, clock=None, profiler=None):
+        self.rules = rules if rules is not None else Rules()
+        self.rng = random.Random(seed)
+        self.clock = clock if clock is not None else SimClock()
+        self.profiler = profiler if profiler is not None else NULL_PROFILER  # 処理時間の計測
+        self.zombies = EntityStore()
+        self.plants = EntityStore()
+        self.bullets = EntityStore()
+        self.bullet_pool = BulletPool()
+        self.lanes = LaneIndex(GRID_ROWS)
+        self.board = Board()  # マスごとの植物
+        self.money = self.rules.initial_money
+        self.score = 0
+        self.last_money_update = self.clock.now()  # 最後にmoneyを増やした時間
+        self.last_zombie_spawn = self.clock.now()  # 最後にゾンビを出した時間
+        self.scheduler = Scheduler()  # moneyの増加・ゾンビの出現・攻撃こうかとんの発射の時刻
+        self.parked = [[] for _ in range(GRID_ROWS)]  # 撃てるがレーンにゾンビがいない攻撃こうかとん
+        self._schedule(self.last_money_update, self.rules.money_increase_interval, TIMER_MONEY, 0, "money")
+        if self.rules.zombies_per_spawn:
+            self._schedule(self.last_zombie_spawn, self.rules.zombie_spawn_interval, TIMER_SPAWN, 0, "spawn")
+        for index, wave in enumerate(wave_timeline(self.rules)):
+            self._schedule(wave.at, 0, TIMER_WAVE, index, wave)
+        self.game_over = False  # ゾンビが陣地に入ったか
+        self.cleared = False  # scoreがクリア条件に届いたか
+        self.breaches = 0  # 陣地に入ったゾンビの数（lose_on_breachがFalseのとき）
+
+    @property
+    def now(self):
+        """シミュレーション内の現在時刻（ミリ秒）"""
+        return self.clock.now()
+
+    @property
+    def ticks(self):
+        """進めたステップ数"""
+        return self.clock.ticks
+
+    @property
+    def finished(self):
+        """ゲームが終わったか"""
+        return self.game_over or self.cleared
+
+    def place(self, kind, pos):
+        """
+        posのマスに植物を設置する
+        引数1 kind：PLANT_KINDSのキー、引数2 pos：ドロップした座標
+        戻り値：設置できたか（盤面の外・植物があるマス・お金が足りないときは設置しない）
+        """
+        plant_class, cost, hp = PLANT_KINDS[kind]
+        cell = cell_at(pos)
+        if cell is None or self.money < cost or self.board.get(*cell) is not None:
+            return False
+        plant = plant_class(*cell_origin(*cell), hp=hp, now=self.now)
+        self.plants.add(plant)
+        self.board.put(*cell, plant)
+        if plant.shoot_interval is not None:
+            self._schedule(plant.last_shot_time, plant.shoot_interval, TIMER_SHOOT, plant.serial, plant)
+        self.money -= cost
+        return True
+
+    def dig(self, pos):
+        """
+        posのマスの植物をscopで取り除く
+        戻り値：取り除けたか
+        """
+        cell = cell_at(pos)
+        plant = self.board.get(*cell) if cell is not None else None
+        if plant is None:
+            return False
+        self._remove_plant(plant)
+        return True
+
+    def _remove_plant(self, plant):
+        """植物を盤面から取り除く"""
+        self.plants.discard(plant)
+        self.board.remove(plant)
+
+    def spawn_zombie(self, kind, row):
+        """row行目の右端にkindのゾンビを出す"""
+        speed, hp, image = ZOMBIE_KINDS[kind]
+        zombie = Zombie(SCREEN_WIDTH - 50, INFO_AREA_HEIGHT + row * GRID_SIZE, speed=speed, hp=hp, zombie_image_path=image)
+        self.zombies.add(zombie)
+        return zombie
+
+    def entity_counts(self):
+        """生きているゾンビ・植物・弾の数"""
+        return {
+            "zombies": sum(1 for z in self.zombies if z.alive),
+            "plants": sum(1 for p in self.plants if p.alive),
+            "bullets": sum(1 for b in self.bullets if b.alive),
+        }
+
+    def snapshot(self):
+        """
+        盤面の状態を比較しやすい形で返す
+        ゾンビ：(x, y, HP, 画像)、植物：(種類, x, y, HP, 最後に撃った時刻)、弾：(x, y)
+        """
+        return {
+            "ticks": self.ticks,
+            "money": self.money,
+            "score": self.score,
+            "game_over": self.game_over,
+            "cleared": self.cleared,
+            "breaches": self.breaches,
+            "zombies": [(z.rect.x, z.rect.y, z.hp, z.image) for z in self.zombies if z.alive],
+            "plants": [(type(p).__name__, p.rect.x, p.rect.y, p.hp, p.last_shot_time) for p in self.plants if p.alive],
+            "bullets": [(b.rect.x, b.rect.y) for b in self.bullets if b.alive],
+        }
+
+    def _schedule(self, since, interval, order, key, event, earliest=0):
+        """sinceからinterval後のステップ（earliestより前にはしない）にeventを予約する"""
+        tick = due_tick(self.clock, since, interval)
+        if tick is not None:
+            self.scheduler.schedule(max(tick, earliest), order, key, event)
+
+    def _reschedule(self, current_time, interval, order, key, event):
+        """
+        今のステップで起きたeventを次に予約する
+        間隔が0以下でも1ステップに1回まで（毎ステップ調べていたときと同じ）で、
+        同じステップの後の処理で取り出されないよう次のステップ以降にする
+        """
+        self._schedule(current_time, interval, order, key, event, earliest=self.ticks + 1)
+
+    def _tick_timers(self, current_time):
+        """時刻になったmoneyの増加とゾンビの出現"""
+        rules = self.rules
+        for event in self.scheduler.pop_due(self.ticks, TIMER_WAVE):
+            if event == "money":  # 時間経過でmoneyを増やす
+                self.money += rules.money_increase_amount
+                self.last_money_update = current_time
+                self._reschedule(current_time, rules.money_increase_interval, TIMER_MONEY, 0, "money")
+            elif event == "spawn":  # ゾンビを定期的に出現
+                for _ in range(rules.zombies_per_spawn):
+                    kind = pick_zombie_kind(self.rng, rules.zombie_weights)
+                    self.spawn_zombie(kind, self.rng.randint(0, GRID_ROWS - 1))
+                self.last_zombie_spawn = current_time
+                self._reschedule(current_time, rules.zombie_spawn_interval, TIMER_SPAWN, 0, "spawn")
+            else:  # 決まった時刻のゾンビの群れ
+                for kind, row in wave_zombies(self.rng, event):
+                    self.spawn_zombie(kind, row)
+
+    def _shoot(self, current_time):
+        """
+        撃つ時刻になった攻撃こうかとんが弾を発射
+        レーンにゾンビがいなければ待機させ、ゾンビが来たステップで撃たせる
+        """
+        lanes = self.lanes
+        ready = self.scheduler.pop_due(self.ticks, TIMER_SHOOT)
+        for lane, parked in enumerate(self.parked):
+            if parked and lanes.has_zombie(lane):
+                ready.extend(parked)
+                parked.clear()
+        if not ready:
+            return
+        ready.sort(key=lambda plant: plant.serial)  # 弾は植物の設置順に発射する
+        for plant in ready:
+            if not plant.alive:
+                continue
+            if lanes.has_zombie(plant.lane):
+                self.bullets.add(plant.shoot(self.bullet_pool, current_time))
+                self._reschedule(current_time, plant.shoot_interval, TIMER_SHOOT, plant.serial, plant)
+            else:
+                self.parked[plant.lane].append(plant)
+
+    def _move_bullets(self):
+        """弾の移動と衝突判定（スコアが順番に依存するので弾は発射順に処理する）"""
+        lanes = self.lanes
+        damage = self.rules.bullet_damage
+        for bullet in self.bullets:
+            if not bullet.alive:
+                continue
+            bullet.move()
+            zombie = lanes.zombie_hit_by(bullet.rect, bullet.lane)
+            if zombie is not None:
+                zombie.take_damage(damage)
+                self.bullets.discard(bullet)
+                self.score += 1  # スコアを１増やす
+                if zombie.alive == False:  # ゾンビを倒したら
+                    self.score *= 2  # スコアを2倍にする
+                    self.zombies.discard(zombie)
+            elif bullet.rect.x > SCREEN_WIDTH:
+                self.bullets.discard(bullet)
+
+    def _contact(self):
+        """ゾンビと植物の衝突判定"""
+        board = self.board
+        for zombie in self.zombies:
+            zombie.attacking = False  # 初期化：毎ループでリセット
+            if not zombie.alive:
+                continue
+            for plant in board.plants_touching(zombie.rect, zombie.lane):
+                if plant.alive:
+                    zombie.attacking = True  # 衝突中
+                    plant.take_damage(CONTACT_DAMAGE)  # 植物に継続的ダメージ
+                    if plant.hp <= 0:  # 植物が倒れた場合
+                        self._remove_plant(plant)  # 植物を無効化
+                        zombie.attacking = False  # ゾンビは再び移動可能
+                        zombie.reset_speed()  # 速度を元に戻す
+                        break
+            if not zombie.attacking and zombie.alive:  # 攻撃中でなければ速度をリセット
+                zombie.reset_speed()
+
+    def _move_zombies(self):
+        """ゾンビの移動とゲームオーバー判定"""
+        for zombie in self.zombies:
+            if zombie.alive:
+                zombie.move()
+                if zombie.is_off_screen():
+                    if self.rules.lose_on_breach:
+                        self.game_over = True
+                    else:
+                        self.breaches += 1
+                        self.zombies.discard(zombie)
+
+    def _sweep(self):
+        """倒されたゾンビ・植物と使い終わった弾をまとめて取り除く"""
+        self.zombies.sweep()
+        self.plants.sweep()
+        self.bullets.sweep(self.bullet_pool.release)
+
+    def step(self):
+        """1ステップ（1フレーム分）ゲームを進める"""
+        if self.finished:
+            return
+        profiler = self.profiler
+        current_time = self.now
+        with profiler.phase("timers"):
+            self._tick_timers(current_time)
+        with profiler.phase("lane_index"):
+            self.lanes.rebuild(self.zombies)  # レーンごとのゾンビの索引を作り直す
+        with profiler.phase("shoot"):
+            self._shoot(current_time)
+        with profiler.phase("bullets"):
+            self._move_bullets()
+        with profiler.phase("contact"):
+            self._contact()
+        with profiler.phase("zombies"):
+            self._move_zombies()
+        clear_score = self.rules.clear_score
+        if clear_score is not None and self.score >= clear_score:  # scoreが100万を超えるとクリア
+            self.cleared = True
+        with profiler.phase("sweep"):
+            self._sweep()
+        self.clock.advance()
+
+    def run(self, max_ticks):
+        """ゲームが終わるかmax_ticksステップ進むまで描画なしで進める"""
+        for _ in range(max_ticks):
+            if self.finished:
+                break
+            self.step()
+        return self
+
+# 入力の記録：seedと、どのステップでどの操作をしたかをバイナリで書き出す
+# 時刻はステップ数（×STEP_MS ミリ秒）で表すので、実時間に関係なく同じ順番で再生できる
+INPUT_LOG_MAGIC = b"KVZR"
+INPUT_LOG_VERSION = 1
+INPUT_LOG_HEADER = struct.Struct("<4sBQ")  # 識別子、版、seed
+INPUT_LOG_RECORD = struct.Struct("<IBhh")  # ステップ数、操作、x、y（1件9バイト）
+INPUT_LOG_END = 255  # 記録の終わり（ステップ数は最後のステップ数、続けて最後の状態のハッシュ）
+COMMANDS = ("shooter", "wall", "dig")  # 操作の番号 -> 操作の名前
+
+InputCommand = collections.namedtuple("InputCommand", "tick command pos")
+InputLog = collections.namedtuple("InputLog", "seed commands final_ticks final_hash")
+
+def apply_command(sim, command, pos):
+    """操作をsimに反映する（"shooter"/"wall"は設置、"dig"はscopで取り除く）"""
+    if command == "dig":
+        return sim.dig(pos)
+    return sim.place(command, pos)
+
+def state_hash(sim):
+    """盤面の状態のハッシュ（SHA-256）"""
+    text = json.dumps(sim.snapshot(), sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+class InputRecorder:
+    """
+    ゲーム中の操作をファイルに記録する
+    record()を操作のたびに、close()を終了時に呼ぶ
+    """
+    def __init__(self, path, seed):
+        self.file = open(path, "wb")
+        self.file.write(INPUT_LOG_HEADER.pack(INPUT_LOG_MAGIC, INPUT_LOG_VERSION, seed))
+        self.count = 0
+
+    def record(self, tick, command, pos):
+        """tickステップ目の前に行った操作を書き込む"""
+        self.file.write(INPUT_LOG_RECORD.pack(tick, COMMANDS.index(command), *pos))
+        self.file.flush()  # 途中で落ちてもそこまでは再生できるようにする
+        self.count += 1
+
+    def close(self, sim):
+        """最後のステップ数と状態のハッシュを書いて閉じる"""
+        if self.file.closed:
+            return
+        self.file.write(INPUT_LOG_RECORD.pack(sim.ticks, INPUT_LOG_END, 0, 0))
+        self.file.write(state_hash(sim))
+        self.file.close()
+
+def read_input_log(path):
+    """
+    記録したファイルを読む
+    最後まで書かれていない（ゲームが途中で落ちた）ときはfinal_ticksとfinal_hashがNone
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, seed = INPUT_LOG_HEADER.unpack_from(data)
+    if magic != INPUT_LOG_MAGIC or version != INPUT_LOG_VERSION:
+        raise ValueError(f"{path}は入力の記録ではありません")
+    commands = []
+    final_ticks = final_hash = None
+    offset = INPUT_LOG_HEADER.size
+    while offset + INPUT_LOG_RECORD.size <= len(data):
+        tick, code, x, y = INPUT_LOG_RECORD.unpack_from(data, offset)
+        offset += INPUT_LOG_RECORD.size
+        if code == INPUT_LOG_END:
+            final_ticks = tick
+            final_hash = data[offset:offset + hashlib.sha256().digest_size]
+            break
+        commands.append(InputCommand(tick, COMMANDS[code], (x, y)))
+    return InputLog(seed, commands, final_ticks, final_hash)
+
+TITLE_FONT_NAME = "hgp創英角ﾎﾟｯﾌﾟ体"  # タイトルなどの画面で使うフォント
+
+@functools.lru_cache(maxsize=None)
+def get_font(name, size):
+    """SysFontの検索は重いので、同じ名前とサイズのフォントは使い回す"""
+    return pygame.font.SysFont(name, size)
+
+class SceneCache:
+    """
+    タイトル・クリア・ゲームオーバーなどの静止画面を一度だけ描画して保持する
+    2回目以降は保持しているSurfaceを返すだけ
+    """
+    def __init__(self, builders):
+        self._builders = builders  # 画面名 -> 画面Surfaceを作る関数
+        self._scenes = {}
+
+    def get(self, name):
+        """画面名に対応する描画済みSurfaceを返す"""
+        scene = self._scenes.get(name)
+        if scene is None:
+            scene = self._builders[name]()
+            self._scenes[name] = scene
+        return scene
+
+    def clear(self):
+        """保持している画面を捨てる（画面サイズの変更時など）"""
+        self._scenes.clear()
+
+def render_title():
+    """
+    タイトル画面のSurfaceを生成する関数
+    戻り値：タイトル画面Surface
     """
     title = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))  # タイトル画面の背景Surface生成
     pygame.draw.rect(title, (230,230,250), pygame.Rect(0,0,SCREEN_WIDTH,SCREEN_HEIGHT))
-    fonto = pygame.font.SysFont("hgp創英角ﾎﾟｯﾌﾟ体", 50)  # タイトルの文字Surface生成
+    fonto = get_font(TITLE_FONT_NAME, 50)  # タイトルの文字Surface生成
     title_txt = fonto.render("こうかとん VS ゾンビ", True, (0, 0, 0))  #文字をこうかとん VSゾンビ,色を黒に設定
     title_txt_rct = title_txt.get_rect()  #タイトルテキストのrectを抽出
     title_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2-100)
     dis_txt = fonto.render("Enterを押してゲームスタート", True, (0,0,0))  # 説明の文字Surface生成
     dis_txt_rct = dis_txt.get_rect()  # 説明テキストのrectを抽出
     dis_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2+50)
-    kk_img = pygame.transform.rotozoom(pygame.image.load("fig/2.png"), 0, 1.5)
+    kk_img = assets.get("2.png", zoom=1.5)
     kk_rct = kk_img.get_rect()
     kk_rct.center = 300, 100
-    screen.blit(title, [0,0])
-    screen.blit(title_txt, title_txt_rct)
-    screen.blit(dis_txt, dis_txt_rct)
-    screen.blit(kk_img, kk_rct)
+    title.blit(title_txt, title_txt_rct)
+    title.blit(dis_txt, dis_txt_rct)
+    title.blit(kk_img, kk_rct)
+    return title
+
+def render_finish():
+    """
+    クリア画面のSurfaceを生成する関数
+    戻り値：クリア画面Surface
+    """
+    clear = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.draw.rect(clear, (230,230,0), pygame.Rect(0,0,SCREEN_WIDTH,SCREEN_HEIGHT))
+    fonto = get_font(TITLE_FONT_NAME, 50)
+    title_txt = fonto.render("クリアおめでとう", True, (0, 0, 0))  #文字をクリアおめでとう,色を黒に設定
+    title_txt_rct = title_txt.get_rect()  #タイトルテキストのrectを抽出
+    title_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2-100)
+    dis_txt = fonto.render("×を押して終了してね", True, (0,0,0))
+    dis_txt_rct = dis_txt.get_rect()
+    dis_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2+50)
+    kk_img = assets.get("9.png", zoom=2)
+    kk_rct = kk_img.get_rect()
+    kk_rct.center = 500, 500
+    clear.blit(title_txt, title_txt_rct)
+    clear.blit(dis_txt, dis_txt_rct)
+    clear.blit(kk_img, kk_rct)
+    return clear
+
+def render_gameover():
+    """
+    ゲームオーバー画面のSurfaceを生成する関数
+    戻り値：ゲームオーバー画面Surface
+    """
+    gameover = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.draw.rect(gameover, (0,0,0), pygame.Rect(0,0,SCREEN_WIDTH,SCREEN_HEIGHT))
+    fonto = get_font(TITLE_FONT_NAME, 100)
+    dis = get_font(TITLE_FONT_NAME, 50)
+    title_txt = fonto.render("Game Over", True, (255, 255, 255))  #文字をGame Over,色を白に設定
+    title_txt_rct = title_txt.get_rect()  #タイトルテキストのrectを抽出
+    title_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2)
+    dis_txt = dis.render("×を押して終了してね", True, (255,255,255))
+    dis_txt_rct = dis_txt.get_rect()
+    dis_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2+100)
+    kk_img = assets.get("8.png", zoom=2)
+    kk_rct = kk_img.get_rect()
+    kk_rct.center = 500, 500
+    gameover.blit(title_txt, title_txt_rct)
+    gameover.blit(dis_txt, dis_txt_rct)
+    gameover.blit(kk_img, kk_rct)
+    return gameover
+
+scenes = SceneCache({
+    "title": render_title,
+    "finish": render_finish,
+    "gameover": render_gameover,
+})
+
+def draw_title(screen: pygame.Surface):
+    """
+    タイトル画面を表示する関数
+    引数1 screen：画面Surface
+    """
+    screen.blit(scenes.get("title"), (0, 0))
     pygame.display.update()
 
+class TextCache:
+    """
+    描画済みの文字Surfaceを（文字列, 色, フォント）ごとに覚えておくLRUキャッシュ
+    "SET"のように変わらない文字は使い回し、moneyやscoreは値が変わったときだけ描画する
+    """
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # 古い順に捨てた数
+
+    def render(self, font, text, color):
+        """文字Surfaceを返す（なければ描画して覚える）"""
+        key = (text, color, font)
+        surface = self._cache.get(key)
+        if surface is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self._cache[key] = surface
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def stats(self):
+        """ヒット数・ミス数・捨てた数を返す"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "cached": len(self._cache)}
+
+text_cache = TextCache()
+
 # テキストを描画する関数
 def draw_text(surface, text, x, y, color):
-    rendered_text = font.render(text, True, color)
+    rendered_text = text_cache.render(get_app().font, text, color)
     surface.blit(rendered_text, (x, y))
 
 # マス目を描画する関数
@@ -222,255 +1350,461 @@ def draw_info_area(surface, width, height, money, plant_image, score):
     set_area_x = 160  # moneyの隣に配置
     draw_text(surface, "SET", set_area_x, 20, BLACK)
     surface.blit(plant_image, (set_area_x + 50, 5))  # SETエリアに植物アイコンを表示
-    surface.blit(plant_image2, (set_area_x + 150, 5))  # SETエリアに植物アイコンを表示
+    surface.blit(assets.get(*PLANT_WALL_IMAGE), (set_area_x + 150, 5))  # SETエリアに植物アイコンを表示
     # score表示(右上)
     draw_text(surface, f"score: {score}", 800, 20, BLACK)
 
+SCOP_ICON_POS = (730, 20)  # 情報エリア内のscopアイコンの位置
+
+class Renderer:
+    """
+    ゲーム画面を層に分けて描画するクラス
+    背景（芝生・マス目・情報エリア）は一度だけ合成して保持し、
+    毎フレームは前フレームで動いたものの跡を背景で消して描き直し、
+    変化した範囲（dirty rect）だけを画面に送る
+    植物は動かないので毎フレームは描かず、置かれた・消えた・HPが変わった植物と、
+    消した範囲や動くものに重なった植物だけを描き直す
+    スプライトは層ごとに(画像, 位置)を集めて1回のblits()でまとめて描く
+    """
+    def __init__(self, screen):
+        self.screen = screen
+        self.base = pygame.Surface(screen.get_size()).convert()  # 芝生とマス目だけの層
+        self.background = pygame.Surface(screen.get_size()).convert()  # baseに情報エリアを重ねた層
+        # 情報エリアとはみ出したscopアイコンを合わせた範囲
+        self.info_rect = pygame.Rect(0, 0, SCREEN_WIDTH, INFO_AREA_HEIGHT).union(
+            pygame.Rect(SCOP_ICON_POS, SCOP_IMAGE_SIZE))
+        self._info_key = None  # 情報エリアに描いてある（money, score）
+        self._prev_rects = []  # 前フレームで描いた範囲
+        self._rects = []  # このフレームで描いた範囲（次のフレームで背景に戻す）
+        self._static_rects = []  # このフレームだけ画面に送る範囲（植物や情報エリアなど、次のフレームで消さないもの）
+        self._plants = {}  # 画面に描いてある植物のserial -> (描いた状態, 描いた範囲)
+        self._full_update = True  # 次のフレームで画面全体を送るか
+        self._batch = []  # まだ描いていない(画像, 位置)
+        self._frame_start = time.perf_counter()
+        self._draw_calls = 0
+        self._sprites = 0
+        self.frame_stats = {"draw_calls": 0, "sprites": 0, "dirty_rects": 0, "render_ms": 0.0}  # 直前のフレームの統計
+        self._compose_background()
+
+    def _compose_background(self):
+        """芝生とマス目を背景Surfaceに描く"""
+        self.base.fill(GREEN)
+        draw_grid(self.base, GRID_ROWS, GRID_COLUMNS, GRID_SIZE, GRID_OFFSET_X, INFO_AREA_HEIGHT)
+        self.background.blit(self.base, (0, 0))
+        self._info_key = None
+
+    def invalidate(self):
+        """次のフレームで画面全体を描き直す（静止画面から戻ったときなど）"""
+        self._full_update = True
+
+    def begin_frame(self, money, score):
+        """前フレームの跡を消し、必要なら情報エリアを描き直す"""
+        self._frame_start = time.perf_counter()
+        self._draw_calls = 0
+        self._sprites = 0
+        info_changed = (money, score) != self._info_key
+        if info_changed:
+            self._info_key = (money, score)
+            self.background.blit(self.base, self.info_rect, self.info_rect)
+            draw_info_area(self.background, SCREEN_WIDTH, INFO_AREA_HEIGHT, money, assets.get(*PLANT_IMAGE), score)
+            self.background.blit(assets.get(*SCOP_IMAGE), SCOP_ICON_POS)  # scopアイコンを情報エリアに描画
+        if self._full_update:
+            self.screen.blit(self.background, (0, 0))
+            self._draw_calls += 1
+        else:
+            restore = [(self.background, rect, rect) for rect in self._prev_rects]
+            if info_changed:
+                restore.append((self.background, self.info_rect, self.info_rect))
+                self._static_rects.append(self.info_rect)
+            if restore:
+                self.screen.blits(restore, doreturn=False)
+                self._draw_calls += 1
+
+    def draw(self, sprite, alpha=1.0):
+        """sprite.draw()で描く(画像, 位置)をこの層に加える"""
+        sprite.draw(self._batch, alpha)
+
+    def blit(self, image, pos):
+        """画像をこの層に加える"""
+        self._batch.append((image, pos))
+
+    def draw_plants(self, plants):
+        """
+        ここまでに集めた層（ゾンビなど）を描き、その上に描き直しが必要な植物だけを描く
+        植物の範囲を背景に戻してから下の層を描くので、重なり方は毎フレーム全部描くときと同じになる
+        """
+        below = [image.get_rect(topleft=pos) for image, pos in self._batch]
+        touched = self._prev_rects + self._static_rects + below  # 背景に戻した範囲と下の層が描く範囲
+        shown = {}
+        redraw = []
+        for plant in plants:
+            if not plant.alive:
+                continue
+            state = (plant.rect.topleft, plant.hp)
+            drawn = self._plants.pop(plant.serial, None)
+            if drawn is not None and drawn[0] == state:
+                footprint = drawn[1]
+                changed = False
+            else:
+                sprites = []
+                plant.draw(sprites)
+                footprint = pygame.Rect(sprites[0][1], sprites[0][0].get_size()).unionall(
+                    [pygame.Rect(pos, image.get_size()) for image, pos in sprites[1:]])
+                changed = True
+            shown[plant.serial] = (state, footprint)
+            if changed or self._full_update or footprint.collidelist(touched) != -1:
+                redraw.append(plant)
+        erase = [footprint for _, footprint in self._plants.values()]  # 消えた植物
+        erase.extend(shown[plant.serial][1] for plant in redraw)
+        self._plants = shown
+        if erase and not self._full_update:
+            self.screen.blits([(self.background, rect, rect) for rect in erase], doreturn=False)
+            self._draw_calls += 1
+            self._static_rects.extend(erase)
+        self.flush()
+        for plant in redraw:
+            plant.draw(self._batch)
+        if self._batch:
+            self._static_rects.extend(self.screen.blits(self._batch))
+            self._draw_calls += 1
+            self._sprites += len(self._batch)
+            self._batch.clear()
+
+    def flush(self):
+        """この層に集めた画像を1回のblits()で描き、描いた範囲を記録する"""
+        if self._batch:
+            self._rects.extend(self.screen.blits(self._batch))
+            self._draw_calls += 1
+            self._sprites += len(self._batch)
+            self._batch.clear()
+
+    def present(self):
+        """残りの層を描き、変化した範囲だけを画面に反映する"""
+        self.flush()
+        if self._full_update:
+            pygame.display.update()
+            self._full_update = False
+            dirty = []
+        else:
+            # 止まっているゾンビなど、前フレームとこのフレームで同じ範囲は1回だけ送る
+            dirty = list({tuple(rect): rect for rect in self._prev_rects + self._rects + self._static_rects}.values())
+            pygame.display.update(dirty)
+        self.frame_stats = {
+            "draw_calls": self._draw_calls + 1,  # 最後のdisplay.updateも数える
+            "sprites": self._sprites,
+            "dirty_rects": len(dirty),
+            "render_ms": (time.perf_counter() - self._frame_start) * 1000,
+        }
+        self._prev_rects = self._rects
+        self._rects = []
+        self._static_rects = []
+
+def draw_entities(renderer, sim, alpha=1.0):
+    """
+    シミュレーションのゾンビ・植物・弾を描画する
+    引数 alpha：動くものを1ステップ前の位置からどれだけ進めて描くか（0〜1）
+    """
+    # ゾンビの描画
+    for zombie in sim.zombies:
+        if zombie.alive:
+            renderer.draw(zombie, alpha)
+    # 植物の描画（ゾンビの層を描いてから、描き直しが必要な植物だけをその上に描く）
+    renderer.draw_plants(sim.plants)
+    # 弾の描画
+    for bullet in sim.bullets:
+        if bullet.alive:
+            renderer.draw(bullet, alpha)
+    renderer.flush()  # 弾の層をまとめて描く
+
+PROFILER_OVERLAY_POS = (GRID_OFFSET_X + GRID_COLUMNS * GRID_SIZE + 5, INFO_AREA_HEIGHT + 5)  # 盤面の右の空き地
+
+class ProfilerOverlay:
+    """
+    F3キーで表示を切り替える処理時間の一覧
+    区間ごとの直近の平均とp99、FPS、エンティティ数を表示する
+    文字の描画は重いので、refreshフレームに1回だけ作り直す
+    """
+    def __init__(self, refresh=15):
+        self.visible = False
+        self.refresh = refresh
+        self._font = None  # 最初に表示するときに作る
+        self._surface = None
+        self._age = 0
+
+    def _render(self, profiler):
+        """表示内容のSurfaceを作る"""
+        if self._font is None:
+            self._font = pygame.font.Font(None, 18)
+        stats = profiler.stats()
+        lines = []
+        if "frame" in stats:
+            avg, p99 = stats["frame"]
+            lines.append(f"frame {avg:6.2f} p99 {p99:6.2f} ({1000 / avg if avg else 0:.0f} fps)")
+        for name in PROFILE_PHASES:
+            if name in stats:
+                avg, p99 = stats[name]
+                lines.append(f"{name:<16}{avg:6.2f} p99 {p99:6.2f}")
+        lines.append(" ".join(f"{name}:{count}" for name, count in profiler.counts.items()))
+        for name, counter in profiler.counters().items():
+            lines.append(f"{name} hit {counter['hits']} miss {counter['misses']}")
+        line_height = self._font.get_linesize()
+        surface = pygame.Surface((SCREEN_WIDTH - PROFILER_OVERLAY_POS[0], line_height * len(lines) + 4))
+        surface.set_alpha(200)
+        for i, line in enumerate(lines):
+            surface.blit(self._font.render(line, True, WHITE), (2, 2 + i * line_height))
+        return surface
+
+    def draw(self, renderer, profiler):
+        """表示中なら計測結果を描画する"""
+        if not self.visible or not profiler.enabled:
+            return
+        self._age += 1
+        if self._surface is None or self._age >= self.refresh:
+            self._surface = self._render(profiler)
+            self._age = 0
+        renderer.blit(self._surface, PROFILER_OVERLAY_POS)
+
 def draw_finish(screen: pygame.Surface):
     """
     クリア画面を表示する関数
     引数1 screen：画面Surface
     """
-    clear = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.draw.rect(clear, (230,230,0), pygame.Rect(0,0,SCREEN_WIDTH,SCREEN_HEIGHT))
-    fonto = pygame.font.SysFont("hgp創英角ﾎﾟｯﾌﾟ体", 50)
-    title_txt = fonto.render("クリアおめでとう", True, (0, 0, 0))  #文字をクリアおめでとう,色を黒に設定
-    title_txt_rct = title_txt.get_rect()  #タイトルテキストのrectを抽出
-    title_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2-100)
-    dis_txt = fonto.render("×を押して終了してね", True, (0,0,0))
-    dis_txt_rct = dis_txt.get_rect()
-    dis_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2+50)
-    kk_img = pygame.transform.rotozoom(pygame.image.load("fig/9.png"), 0, 2)
-    kk_rct = kk_img.get_rect()
-    kk_rct.center = 500, 500
-    screen.blit(clear, [0,0])
-    screen.blit(title_txt, title_txt_rct)
-    screen.blit(dis_txt, dis_txt_rct)
-    screen.blit(kk_img, kk_rct)
+    screen.blit(scenes.get("finish"), (0, 0))
 
 def draw_gameover(screen: pygame.Surface):
     """
     ゲームオーバー画面を表示する関数
     引数1 screen：画面Surface
     """
-    gameover = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.draw.rect(gameover, (0,0,0), pygame.Rect(0,0,SCREEN_WIDTH,SCREEN_HEIGHT))
-    fonto = pygame.font.SysFont("hgp創英角ﾎﾟｯﾌﾟ体", 100)
-    dis = pygame.font.SysFont("hgp創英角ﾎﾟｯﾌﾟ体", 50)
-    title_txt = fonto.render("Game Over", True, (255, 255, 255))  #文字をGame Over,色を白に設定
-    title_txt_rct = title_txt.get_rect()  #タイトルテキストのrectを抽出
-    title_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2)
-    dis_txt = dis.render("×を押して終了してね", True, (255,255,255))
-    dis_txt_rct = dis_txt.get_rect()
-    dis_txt_rct.center = (SCREEN_WIDTH/2, SCREEN_HEIGHT/2+100)
-    kk_img = pygame.transform.rotozoom(pygame.image.load("fig/8.png"), 0, 2)
-    kk_rct = kk_img.get_rect()
-    kk_rct.center = 500, 500
-    screen.blit(gameover, [0,0])
-    screen.blit(title_txt, title_txt_rct)
-    screen.blit(dis_txt, dis_txt_rct)
-    screen.blit(kk_img, kk_rct)
+    screen.blit(scenes.get("gameover"), (0, 0))
+
+# ゲームで使うイベントの種類（これ以外はキューに入れない）
+GAME_EVENTS = (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION,
+               pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)
+
+# ドラッグを始められる情報エリア内の範囲と、そこからドロップしたときの操作
+DRAG_SOURCES = (
+    ("dig", pygame.Rect((700, 20), SCOP_IMAGE_SIZE)),  # scopアイテム
+    ("shooter", pygame.Rect((200, 13), PLANT_IMAGE_SIZE)),  # 攻撃用
+    ("wall", pygame.Rect((300, 13), PLANT_IMAGE_SIZE)),  # 守り用
+)
+
+def restrict_events():
+    """イベントキューにGAME_EVENTSだけが入るようにする"""
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(GAME_EVENTS)
+
+class InputHandler:
+    """
+    マウスのドラッグ＆ドロップを操作の列に変える
+    1フレーム分のイベントをすべて順に処理し、ドロップのたびに(操作, 座標)をcommandsに積むので、
+    同じフレームに何回クリックしても取りこぼさない
+    MOUSEMOTIONはフレームの最後の位置だけをドラッグ中の画像の位置に反映する
+    """
+    def __init__(self):
+        self.dragging = None  # ドラッグ中の操作（DRAG_SOURCESの操作の名前）
+        self.drag_rect = pygame.Rect(SCOP_ICON_POS, SCOP_IMAGE_SIZE)  # ドラッグ中の画像の位置
+        self.commands = collections.deque()  # まだsimに反映していない(操作, 座標)
+
+    def handle(self, events):
+        """マウスのイベントを順に処理する"""
+        motion = None  # 最後のボタン操作より後の最後のマウスの位置
+        for event in events:
+            if event.type == pygame.MOUSEMOTION:
+                motion = event.pos
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                motion = None
+                for command, area in DRAG_SOURCES:
+                    if area.collidepoint(event.pos):
+                        self.dragging = command
+                        self.drag_rect.size = area.size
+                        self.drag_rect.topleft = event.pos
+                        break
+            elif event.type == pygame.MOUSEBUTTONUP:
+                motion = None
+                if self.dragging is not None:
+                    self.commands.append((self.dragging, event.pos))
+                    self.dragging = None
+        if motion is not None and self.dragging is not None:
+            self.drag_rect.center = motion
+
+    def take_commands(self):
+        """たまった操作を古い順に取り出す"""
+        while self.commands:
+            yield self.commands.popleft()
 
 # メインのゲームループ
-def main():
-    global money, last_money_update, last_zombie_spawn, game_start
+def main(profile=False, trace_path=None, max_catch_up=MAX_CATCH_UP_STEPS, startup_report=False,
+         seed=None, record_path=None):
+    """
+    ゲームを起動する
+    引数1 profile：起動時から処理時間を計測して表示するか
+    引数2 trace_path：1フレームごとの処理時間を書き出すファイル
+    引数3 max_catch_up：遅れたときに1フレームで進める最大ステップ数
+    引数4 startup_report：最初のタイトル画面までの時間を表示するか
+    引数5 seed：ゾンビの出現に使う乱数のseed（Noneなら毎回変わる）
+    引数6 record_path：操作を記録するファイル（replay.pyで再生できる）
+    """
+    global game_start
+    screen = get_app().screen
     clock = pygame.time.Clock()
+    profiler = FrameProfiler(trace_path=trace_path) if profile or trace_path else NULL_PROFILER
+    overlay = ProfilerOverlay()
+    overlay.visible = profile
+    if seed is None:
+        seed = random.randrange(1 << 63)  # 記録から再生できるようにseedを決めておく
+    sim = Simulation(seed, profiler=profiler)  # ゲーム本体（描画以外）
+    recorder = InputRecorder(record_path, seed) if record_path else None
+    loop = FixedStepLoop(max_catch_up=max_catch_up)  # 実時間に合わせてsimを進める
 
-    # ゾンビと植物のリスト
-    zombies = []
-    plants = []
-    bullets = []
-
-    # 植物のドラッグ管理
-    dragging = False
-    dragging2 = False
-    dragging_plant_rect = plant_image.get_rect()
-    dragging_plant_rect2 = plant_image2.get_rect()
-    # scop画像の読み込み
-    scop_image = pygame.image.load(os.path.join(current_path, "fig", "scop.png"))
-    scop_image = pygame.transform.scale(scop_image, (48, 64))  # サイズ調整
-    # scopアイテムのドラッグ管理
-    dragging_scop = False
-    dragging_scop_rect = scop_image.get_rect()
-    dragging_scop_rect.topleft = (730, 20)  # 初期位置（情報エリア内）
-    
-    # score
-    score = 0
+    def quit_game():
+        """トレースと操作の記録を閉じてゲームを終了する"""
+        profiler.close()
+        if recorder is not None:
+            recorder.close(sim)
+        pygame.quit()
+        sys.exit()
+
+    # 植物とscopアイテムのドラッグ管理
+    mouse = InputHandler()
+    renderer = None  # ゲーム画面を最初に出すときに作る
+    shown_scene = None  # 表示中の静止画面の名前
+    title_shown_once = False
 
     # ゲームループ
     while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
-                game_start = True
-        
+        if game_start != True and shown_scene is not None:
+            # 静止画面の表示中は、イベントが来るまで待機してCPUを使わない
+            events = [pygame.event.wait()] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+        with profiler.phase("events"):
+            for event in events:
+                if event.type == pygame.QUIT:
+                    quit_game()
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN and game_start == None:
+                    game_start = True
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    # 処理時間の表示を切り替える（表示していないときは計測もしない）
+                    overlay.visible = not overlay.visible
+                    if overlay.visible and not profiler.enabled:
+                        profiler = FrameProfiler()
+                    elif not overlay.visible and trace_path is None:
+                        profiler = NULL_PROFILER
+                    sim.profiler = profiler
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    shown_scene = None  # 画面が隠れた後は描き直す
+                    if renderer is not None:  # ゲーム中は変化した範囲以外も送り直す
+                        renderer.invalidate()
 
         if game_start == None:
-            draw_title(screen)
-        if score >= 1000000:  # scoreが100万を超えるとクリア
+            if shown_scene != "title":
+                draw_title(screen)
+                shown_scene = "title"
+                if not title_shown_once:
+                    title_shown_once = True
+                    startup.mark("first_title_frame")
+                    if startup_report:
+                        print(startup.report(), file=sys.stderr)
+                    assets.preload_async(GAME_IMAGE_FILES)  # タイトル画面の間にゲーム画面の画像を読み込む
+        if sim.cleared:  # scoreが100万を超えるとクリア
             game_start = False
-            draw_finish(screen)
-            pygame.display.update()
+            if shown_scene != "finish":
+                draw_finish(screen)
+                pygame.display.update()
+                shown_scene = "finish"
 
         elif game_start == True:
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                # scopアイテムエリアのクリック判定
-                scop_area_rect = pygame.Rect(700, 20, scop_image.get_width(), scop_image.get_height())
-                if scop_area_rect.collidepoint(event.pos):
-                    dragging_scop = True
-                    dragging_scop_rect.topleft = event.pos
-                set_area_x = 150
-                set_area_rect = pygame.Rect(set_area_x + 50, 13, plant_image.get_width(), plant_image.get_height())  # 攻撃用
-                set_area_rect2 = pygame.Rect(set_area_x + 150, 13, plant_image2.get_width(), plant_image2.get_height()) 
-                if set_area_rect.collidepoint(event.pos):
-                    dragging = True
-                    dragging_plant_rect.topleft = event.pos
-                
-                elif set_area_rect2.collidepoint(event.pos):
-                    dragging2 = True
-                    dragging_plant_rect2.topleft = event.pos
-
-            elif event.type == pygame.MOUSEMOTION:
-                if dragging:
-                    dragging_plant_rect.center = event.pos
-                elif dragging2:
-                    dragging_plant_rect2.center = event.pos
-                elif dragging_scop:
-                    dragging_scop_rect.center = event.pos
-            
+            if renderer is None:  # 最初のゲーム画面で画像と背景を用意する
+                plant_image = assets.get(*PLANT_IMAGE)
+                plant_image2 = assets.get(*PLANT_WALL_IMAGE)
+                scop_image = assets.get(*SCOP_IMAGE)
+                renderer = Renderer(screen)
+            if shown_scene is not None:  # 静止画面からゲーム画面に戻ったら全体を描き直す
+                renderer.invalidate()
+                loop.reset()
+            shown_scene = None
+            with profiler.phase("events"):
+                # このフレームのドロップをすべて起きた順にsimに反映する
+                mouse.handle(events)
+                for command, pos in mouse.take_commands():
+                    if recorder is not None:
+                        recorder.record(sim.ticks, command, pos)
+                    apply_command(sim, command, pos)
 
-            elif event.type == pygame.MOUSEBUTTONUP:
-                if dragging:
-                    dragging = False
-                    mouse_x, mouse_y = event.pos
-                    if mouse_y > INFO_AREA_HEIGHT and mouse_x > GRID_OFFSET_X and money >= 50:
-                        grid_x = ((mouse_x - GRID_OFFSET_X) // GRID_SIZE) * GRID_SIZE + GRID_OFFSET_X
-                        grid_y = ((mouse_y - INFO_AREA_HEIGHT) // GRID_SIZE) * GRID_SIZE + INFO_AREA_HEIGHT
-                        plants.append(Plant(grid_x, grid_y, hp=100))
-                        money -= 50
-                elif  dragging2:
-                    dragging2 = False
-                    mouse_x, mouse_y = event.pos
-                    if mouse_y > INFO_AREA_HEIGHT and mouse_x > GRID_OFFSET_X and money >= 10:
-                        grid_x = ((mouse_x - GRID_OFFSET_X) // GRID_SIZE) * GRID_SIZE + GRID_OFFSET_X
-                        grid_y = ((mouse_y - INFO_AREA_HEIGHT) // GRID_SIZE) * GRID_SIZE + INFO_AREA_HEIGHT
-                        plants.append(Plant_wall(grid_x, grid_y, hp=300))
-                        money -= 10
-                elif dragging_scop:
-                    dragging_scop = False
-                    mouse_x, mouse_y = event.pos
-                    if mouse_y > INFO_AREA_HEIGHT and mouse_x > GRID_OFFSET_X:
-                        grid_x = ((mouse_x - GRID_OFFSET_X) // GRID_SIZE) * GRID_SIZE + GRID_OFFSET_X
-                        grid_y = ((mouse_y - INFO_AREA_HEIGHT) // GRID_SIZE) * GRID_SIZE + INFO_AREA_HEIGHT
-                        # 植物リストを検索して削除
-                        for plant in plants[:]:
-                            if plant.rect.collidepoint(grid_x + GRID_SIZE // 2, grid_y + GRID_SIZE // 2):
-                                plants.remove(plant)
-                                break
-
-
-
-            # 時間経過でmoneyを増やす
-            current_time = pygame.time.get_ticks()
-            if current_time - last_money_update >= money_increase_interval:
-                money += money_increase_amount
-                last_money_update = current_time
-
-            # ゾンビを定期的に出現
-            if current_time - last_zombie_spawn >= zombie_spawn_interval:
-                random_zombie = random.randint(0, 100)
-                random_row = random.randint(0, GRID_ROWS - 1)
-                if random_zombie <= 50:
-                    #50%で通常ゾンビ
-                    zombies.append(Zombie(SCREEN_WIDTH - 50, INFO_AREA_HEIGHT + random_row * GRID_SIZE, speed=2, hp=30, zombie_image_path="zombie_image_2.png"))
-                elif 51 <= random_zombie <= 75:  
-                    #25%で足早+耐久低ゾンビ
-                    zombies.append(Zombie(SCREEN_WIDTH - 50, INFO_AREA_HEIGHT + random_row * GRID_SIZE, speed=4, hp=10, zombie_image_path="zombie_image_1.png"))
-                elif 76 <= random_zombie <= 100:
-                    #25%で足遅+耐久高ゾンビ
-                    zombies.append(Zombie(SCREEN_WIDTH - 50, INFO_AREA_HEIGHT + random_row * GRID_SIZE, speed=1, hp=60, zombie_image_path="zombie_image_3.png"))
-                last_zombie_spawn = current_time
-
-            # 植物が弾を発射
-            for plant in plants:
-                if plant.alive:
-                    bullet = plant.shoot(zombies)
-                    if bullet:
-                        bullets.append(bullet)
-
-            # 弾の移動と衝突判定
-            for bullet in bullets[:]:
-                bullet.move()
-                for zombie in zombies:
-                    if zombie.alive and bullet.rect.colliderect(zombie.rect):
-                        zombie.take_damage(BULLET_DAMAGE)
-                        bullets.remove(bullet)
-                        score += 1  # スコアを１増やす
-                        if zombie.alive == False:  # ゾンビを倒したら
-                            score *= 2  # スコアを2倍にする
-                        break
-                if bullet.rect.x > SCREEN_WIDTH:
-                    bullets.remove(bullet)
+            # 経過時間に応じてゲームを進める（処理が間に合わないときは描画を飛ばす）
+            render = loop.update(sim.step)
 
-            #背景の描画
-            screen.fill(GREEN)
-            draw_info_area(screen, SCREEN_WIDTH, INFO_AREA_HEIGHT, money, plant_image, score)
-            draw_grid(screen, GRID_ROWS, GRID_COLUMNS, GRID_SIZE, GRID_OFFSET_X, INFO_AREA_HEIGHT)
-            # scopアイコンを情報エリアに描画
-            screen.blit(scop_image, (730, 20))
+            # ゲームオーバー判定
+            if sim.game_over:
+                draw_gameover(screen)
+                # draw_text(screen, "GAME OVER", SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2, BLACK)
+                pygame.display.update()
+                pygame.time.wait(3000)
+                quit_game()
 
-            # ドラッグ中のscopアイテムを描画
-            if dragging_scop:
-                screen.blit(scop_image, dragging_scop_rect.topleft)
-            # ゾンビと植物の衝突判定
-            for zombie in zombies:
-                zombie.attacking = False  # 初期化：毎ループでリセット
-                for plant in plants:
-                    if zombie.alive and plant.alive and zombie.rect.colliderect(plant.rect):
-                        zombie.attacking = True  # 衝突中
-                        plant.take_damage(0.3)  # 植物に継続的ダメージ
-                        if plant.hp <= 0:  # 植物が倒れた場合
-                            plant.alive = False  # 植物を無効化
-                            zombie.attacking = False  # ゾンビは再び移動可能
-                            zombie.reset_speed()  # 速度を元に戻す        # ゾンビの動きと描画
-                            break
-                if not zombie.attacking and zombie.alive:  # 攻撃中でなければ速度をリセット
-                    zombie.reset_speed()
-            for zombie in zombies[:]:
-                if zombie.alive:
-                    zombie.move()
-                    zombie.draw(screen)
-
-            # 植物の描画
-            for plant in plants[:]:
-                if plant.alive:
-                    plant.draw(screen)
+            if not render:
+                continue
 
-            # 弾の描画
-            for bullet in bullets:
-                bullet.draw(screen)
+            #背景の描画（前フレームの跡を消し、情報エリアは変化したときだけ描き直す）
+            with profiler.phase("draw_background"):
+                renderer.begin_frame(sim.money, sim.score)
 
-            # ドラッグ中の植物の描画
-            if dragging:
-                screen.blit(plant_image, dragging_plant_rect.topleft)
-            
-            elif dragging2:
-                screen.blit(plant_image2, dragging_plant_rect2.topleft)
+            # ドラッグ中のscopアイテムを描画
+            if mouse.dragging == "dig":
+                renderer.blit(scop_image, mouse.drag_rect.topleft)
 
-            # ゲームオーバー判定
-            for zombie in zombies:
-                if zombie.is_off_screen():
-                    draw_gameover(screen)
-                    # draw_text(screen, "GAME OVER", SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2, BLACK)
-                    pygame.display.update()
-                    pygame.time.wait(3000)
-                    pygame.quit()
-                    sys.exit()
+            # ゾンビ・植物・弾の描画
+            with profiler.phase("draw_entities"):
+                draw_entities(renderer, sim, loop.alpha)
 
-            pygame.display.update()
+            with profiler.phase("draw_overlay"):
+                # ドラッグ中の植物の描画
+                if mouse.dragging == "shooter":
+                    renderer.blit(plant_image, mouse.drag_rect.topleft)
+                elif mouse.dragging == "wall":
+                    renderer.blit(plant_image2, mouse.drag_rect.topleft)
+                # 処理時間の表示
+                overlay.draw(renderer, profiler)
+
+            with profiler.phase("display_update"):
+                renderer.present()
+            if profiler.enabled:
+                frame_stats = renderer.frame_stats
+                profiler.end_frame({"zombies": len(sim.zombies), "plants": len(sim.plants), "bullets": len(sim.bullets),
+                                    "draw_calls": frame_stats["draw_calls"], "sprites": frame_stats["sprites"]})
             clock.tick(60)
 
+def parse_seed(text):
+    """--seedの値を読む（入力の記録には符号なし64ビットで書くので、その範囲に限る）"""
+    seed = int(text)
+    if not 0 <= seed < 1 << 64:
+        raise argparse.ArgumentTypeError(f"seedは0以上2**64未満の整数にしてください: {text}")
+    return seed
+
+def parse_catch_up(text):
+    """--max-catch-upの値を読む（0以下だと1ステップも進まずゲームが止まるので1以上に限る）"""
+    steps = int(text)
+    if steps < 1:
+        raise argparse.ArgumentTypeError(f"1以上の整数にしてください: {text}")
+    return steps
+
+def parse_args(argv=None):
+    """コマンドライン引数を読む"""
+    parser = argparse.ArgumentParser(description="こうかとんVSゾンビ")
+    parser.add_argument("--profile", action="store_true", help="起動時から処理時間を計測して表示する（F3でも切り替え可）")
+    parser.add_argument("--profile-trace", metavar="PATH",
+                        help="1フレームごとの処理時間をCSV（拡張子.csv）またはJSON Linesで書き出す")
+    parser.add_argument("--max-catch-up", type=parse_catch_up, default=MAX_CATCH_UP_STEPS,
+                        help="処理が遅れたときに1フレームで進める最大ステップ数")
+    parser.add_argument("--startup-report", action="store_true", help="起動から最初のタイトル画面までの時間を表示する")
+    parser.add_argument("--seed", type=parse_seed, help="ゾンビの出現に使う乱数のseed（0以上2**64未満）")
+    parser.add_argument("--record", metavar="PATH", help="操作を記録する（python replay.py PATHで再生できる）")
+    return parser.parse_args(argv)
+
+startup.mark("import")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    main(profile=args.profile, trace_path=args.profile_trace, max_catch_up=args.max_catch_up,
+         startup_report=args.startup_report, seed=args.seed, record_path=args.record)
\ No newline at end of file
@@ -0,0 +1,345 @@
+"""
+NumPy配列でゾンビ・植物・弾を持つシミュレーション
+
+KokatonVSZombie.Simulationと同じルール・同じ乱数の使い方で動き、
+同じseedなら同じ結果になる。位置・HP・速度・レーン・生存フラグ・
+撃った時刻を種類ごとの配列で持ち、移動・弾の当たり判定・
+ゾンビと植物の接触判定・陣地への侵入判定を配列演算でまとめて行う。
+何千体ものゾンビを出すエンドレス（負荷試験）モード向け。
+"""
+import random
+
+import numpy as np
+
+import KokatonVSZombie as game
+
+ZOMBIE_WIDTH = game.ENTITY_SIZE[0]
+PLANT_WIDTH = game.ENTITY_SIZE[0]
+BULLET_SIZE = 10
+BULLET_OFFSET_Y = game.ENTITY_SIZE[1] // 2  # 植物の上端から弾の上端まで（Rect.centery）
+LANE_KEY = 1 << 20  # (レーン, x)を1つの整数にまとめるときのレーンの重み
+
+ZOMBIE_KIND_NAMES = list(game.ZOMBIE_KINDS)
+PLANT_KIND_NAMES = list(game.PLANT_KINDS)
+PLANT_CLASS_NAMES = [game.PLANT_KINDS[kind][0].__name__ for kind in PLANT_KIND_NAMES]
+
+
+def _lane_keys(lane, x):
+    """レーンごとにx座標順に並ぶキー"""
+    return lane * LANE_KEY + x
+
+
+def _lane_y(lane):
+    """レーンの上端のy座標"""
+    return game.INFO_AREA_HEIGHT + lane * game.GRID_SIZE
+
+
+class ArraySimulation:
+    """
+    配列版のゲーム本体
+    使い方はKokatonVSZombie.Simulationと同じ（step/run/place/dig/snapshot）
+    """
+    def __init__(self, seed=None, rules=None, clock=None, profiler=None):
+        self.rules = rules if rules is not None else game.Rules()
+        self.rng = random.Random(seed)
+        self.clock = clock if clock is not None else game.SimClock()
+        self.profiler = profiler if profiler is not None else game.NULL_PROFILER
+        # ゾンビ（出現順）
+        self.z_x = np.zeros(0, np.int64)
+        self.z_lane = np.zeros(0, np.int64)
+        self.z_hp = np.zeros(0, np.float64)
+        self.z_speed = np.zeros(0, np.int64)
+        self.z_initial_speed = np.zeros(0, np.int64)
+        self.z_kind = np.zeros(0, np.int64)
+        self.z_alive = np.zeros(0, bool)
+        self.z_attacking = np.zeros(0, bool)
+        # 植物（設置順）
+        self.p_x = np.zeros(0, np.int64)
+        self.p_lane = np.zeros(0, np.int64)
+        self.p_hp = np.zeros(0, np.float64)
+        self.p_kind = np.zeros(0, np.int64)
+        self.p_shooter = np.zeros(0, bool)
+        self.p_last_shot = np.zeros(0, np.float64)
+        self.p_alive = np.zeros(0, bool)
+        self.cell_plant = np.full((game.GRID_ROWS, game.GRID_COLUMNS), -1, np.int64)  # マスごとの植物の番号（-1は空き）
+        # 弾（発射順）
+        self.b_x = np.zeros(0, np.int64)
+        self.b_lane = np.zeros(0, np.int64)
+        self.b_alive = np.zeros(0, bool)
+
+        self.money = self.rules.initial_money
+        self.score = 0
+        self.last_money_update = self.clock.now()
+        self.last_zombie_spawn = self.clock.now()
+        self.waves = game.wave_timeline(self.rules)  # 決まった時刻に出すゾンビ（まだ出していないもの）
+        self.next_wave = 0
+        self.game_over = False
+        self.cleared = False
+        self.breaches = 0
+
+    @property
+    def now(self):
+        """シミュレーション内の現在時刻（ミリ秒）"""
+        return self.clock.now()
+
+    @property
+    def ticks(self):
+        """進めたステップ数"""
+        return self.clock.ticks
+
+    @property
+    def finished(self):
+        """ゲームが終わったか"""
+        return self.game_over or self.cleared
+
+    def place(self, kind, pos):
+        """posのマスに植物を設置する（戻り値：設置できたか。植物があるマスには置かない）"""
+        plant_class, cost, hp = game.PLANT_KINDS[kind]
+        cell = game.cell_at(pos)
+        if cell is None or self.money < cost or self._plant_at(*cell) >= 0:
+            return False
+        self.cell_plant[cell] = len(self.p_x)
+        self.p_x = np.append(self.p_x, game.cell_origin(*cell)[0])
+        self.p_lane = np.append(self.p_lane, cell[0])
+        self.p_hp = np.append(self.p_hp, float(hp))
+        self.p_kind = np.append(self.p_kind, PLANT_KIND_NAMES.index(kind))
+        self.p_shooter = np.append(self.p_shooter, plant_class is game.Plant)
+        self.p_last_shot = np.append(self.p_last_shot, self.now)
+        self.p_alive = np.append(self.p_alive, True)
+        self.money -= cost
+        return True
+
+    def dig(self, pos):
+        """posのマスの植物をscopで取り除く（戻り値：取り除けたか）"""
+        cell = game.cell_at(pos)
+        plant = self._plant_at(*cell) if cell is not None else -1
+        if plant < 0:
+            return False
+        self.p_alive[plant] = False
+        return True
+
+    def _plant_at(self, row, col):
+        """row行col列の生きた植物の番号（なければ-1）"""
+        plant = self.cell_plant[row, col]
+        return plant if plant >= 0 and self.p_alive[plant] else -1
+
+    def spawn_zombie(self, kind, row):
+        """row行目の右端にkindのゾンビを出す"""
+        self._append_zombies([kind], [row])
+
+    def _append_zombies(self, kinds, rows):
+        """ゾンビをまとめて配列の末尾に追加する"""
+        speeds = [game.ZOMBIE_KINDS[kind][0] for kind in kinds]
+        self.z_x = np.append(self.z_x, np.full(len(kinds), game.SCREEN_WIDTH - 50, np.int64))
+        self.z_lane = np.append(self.z_lane, np.asarray(rows, np.int64))
+        self.z_hp = np.append(self.z_hp, np.asarray([game.ZOMBIE_KINDS[kind][1] for kind in kinds], np.float64))
+        self.z_speed = np.append(self.z_speed, np.asarray(speeds, np.int64))
+        self.z_initial_speed = np.append(self.z_initial_speed, np.asarray(speeds, np.int64))
+        self.z_kind = np.append(self.z_kind, np.asarray([ZOMBIE_KIND_NAMES.index(kind) for kind in kinds], np.int64))
+        self.z_alive = np.append(self.z_alive, np.ones(len(kinds), bool))
+        self.z_attacking = np.append(self.z_attacking, np.zeros(len(kinds), bool))
+
+    def entity_counts(self):
+        """生きているゾンビ・植物・弾の数"""
+        return {
+            "zombies": int(self.z_alive.sum()),
+            "plants": int(self.p_alive.sum()),
+            "bullets": int(self.b_alive.sum()),
+        }
+
+    def snapshot(self):
+        """Simulation.snapshot()と同じ形で盤面の状態を返す"""
+        zombies = np.flatnonzero(self.z_alive)
+        plants = np.flatnonzero(self.p_alive)
+        bullets = np.flatnonzero(self.b_alive)
+        return {
+            "ticks": self.ticks,
+            "money": self.money,
+            "score": self.score,
+            "game_over": self.game_over,
+            "cleared": self.cleared,
+            "breaches": self.breaches,
+            "zombies": [(x, _lane_y(lane), hp, game.ZOMBIE_KINDS[ZOMBIE_KIND_NAMES[kind]][2])
+                        for x, lane, hp, kind in zip(self.z_x[zombies].tolist(), self.z_lane[zombies].tolist(),
+                                                     self.z_hp[zombies].tolist(), self.z_kind[zombies].tolist())],
+            "plants": [(PLANT_CLASS_NAMES[kind], x, _lane_y(lane), hp, last)
+                       for kind, x, lane, hp, last in zip(self.p_kind[plants].tolist(), self.p_x[plants].tolist(),
+                                                          self.p_lane[plants].tolist(), self.p_hp[plants].tolist(),
+                                                          self.p_last_shot[plants].tolist())],
+            "bullets": [(x, _lane_y(lane) + BULLET_OFFSET_Y)
+                        for x, lane in zip(self.b_x[bullets].tolist(), self.b_lane[bullets].tolist())],
+        }
+
+    def _tick_timers(self, current_time):
+        """時間経過によるmoneyの増加とゾンビの出現"""
+        rules = self.rules
+        # 時間経過でmoneyを増やす
+        if current_time - self.last_money_update >= rules.money_increase_interval:
+            self.money += rules.money_increase_amount
+            self.last_money_update = current_time
+
+        # ゾンビを定期的に出現（乱数の使い方はSimulationと同じ）
+        if current_time - self.last_zombie_spawn >= rules.zombie_spawn_interval:
+            kinds = []
+            rows = []
+            for _ in range(rules.zombies_per_spawn):
+                kinds.append(game.pick_zombie_kind(self.rng, rules.zombie_weights))
+                rows.append(self.rng.randint(0, game.GRID_ROWS - 1))
+            self._append_zombies(kinds, rows)
+            self.last_zombie_spawn = current_time
+
+        # 決まった時刻のゾンビの群れ
+        while self.next_wave < len(self.waves) and current_time >= self.waves[self.next_wave].at:
+            spawns = game.wave_zombies(self.rng, self.waves[self.next_wave])
+            self._append_zombies([kind for kind, _ in spawns], [row for _, row in spawns])
+            self.next_wave += 1
+
+    def _shoot(self, current_time):
+        """同じレーンにゾンビがいて間隔が空いた攻撃こうかとんが弾を撃つ"""
+        if len(self.p_x) == 0:
+            return
+        has_zombie = np.bincount(self.z_lane[self.z_alive], minlength=game.GRID_ROWS) > 0
+        ready = (self.p_alive & self.p_shooter & has_zombie[self.p_lane]
+                 & (current_time - self.p_last_shot >= game.SHOOT_INTERVAL))
+        if not ready.any():
+            return
+        self.p_last_shot[ready] = current_time
+        self.b_x = np.append(self.b_x, self.p_x[ready] + PLANT_WIDTH)
+        self.b_lane = np.append(self.b_lane, self.p_lane[ready])
+        self.b_alive = np.append(self.b_alive, np.ones(int(ready.sum()), bool))
+
+    def _move_bullets(self):
+        """弾を動かし、当たったゾンビにダメージを与える"""
+        if len(self.b_x) == 0:
+            return
+        self.b_x[self.b_alive] += game.BULLET_SPEED
+        alive_zombies = np.flatnonzero(self.z_alive)
+        keys = _lane_keys(self.z_lane[alive_zombies], self.z_x[alive_zombies])
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        by_key = alive_zombies[order]
+        bullet_keys = _lane_keys(self.b_lane, self.b_x)
+        # x方向に[弾x, 弾x+10)と重なるゾンビの範囲を二分探索で求める
+        lo = np.searchsorted(sorted_keys, bullet_keys - ZOMBIE_WIDTH + 1, "left")
+        hi = np.searchsorted(sorted_keys, bullet_keys + BULLET_SIZE, "left")
+        hit = np.zeros(len(self.b_x), bool)
+        # スコアが順番に依存するので、当たりうる弾だけを発射順に処理する
+        z_alive = self.z_alive
+        z_hp = self.z_hp
+        damage = self.rules.bullet_damage
+        for bullet in np.flatnonzero(self.b_alive & (hi > lo)).tolist():
+            candidates = [z for z in by_key[lo[bullet]:hi[bullet]].tolist() if z_alive[z]]
+            if not candidates:
+                continue
+            zombie = min(candidates)  # 最も先に出現したゾンビ
+            z_hp[zombie] -= damage
+            hit[bullet] = True
+            self.score += 1  # スコアを１増やす
+            if z_hp[zombie] <= 0:  # ゾンビを倒したら
+                z_alive[zombie] = False
+                self.z_attacking[zombie] = False
+                self.score *= 2  # スコアを2倍にする
+        self.b_alive &= ~hit & (self.b_x <= game.SCREEN_WIDTH)
+
+    def _contact(self):
+        """ゾンビと接触している植物にダメージを与え、ゾンビの攻撃状態を決める"""
+        self.z_attacking[:] = False
+        if not self.p_alive.any():
+            self.z_speed[self.z_alive] = self.z_initial_speed[self.z_alive]
+            return
+        # ゾンビと重なりうる列（植物の左端が[x - 植物の幅 + 1, x + ゾンビの幅)にある列）は高々2つ
+        first = np.maximum(0, -((game.GRID_OFFSET_X - self.z_x + PLANT_WIDTH - 1) // game.GRID_SIZE))
+        last = np.minimum(game.GRID_COLUMNS, -((game.GRID_OFFSET_X - self.z_x - ZOMBIE_WIDTH) // game.GRID_SIZE))
+        candidates = []
+        for offset in (0, 1):
+            col = first + offset
+            plant = self.cell_plant[self.z_lane, np.minimum(col, game.GRID_COLUMNS - 1)]
+            plant = np.where(col < last, plant, -1)
+            candidates.append(np.where((plant >= 0) & self.p_alive[plant], plant, -1))
+        near, far = candidates
+        touching = self.z_alive & ((near >= 0) | (far >= 0))
+        # 何にも触れていないゾンビは元の速度に戻す
+        free = self.z_alive & ~touching
+        self.z_speed[free] = self.z_initial_speed[free]
+        # 触れているゾンビだけ出現順に処理する（植物が倒れる順番が結果に影響するため）
+        p_alive = self.p_alive
+        p_hp = self.p_hp
+        near, far = near.tolist(), far.tolist()
+        for zombie in np.flatnonzero(touching).tolist():
+            for plant in sorted(plant for plant in (near[zombie], far[zombie]) if plant >= 0):
+                if not p_alive[plant]:
+                    continue
+                self.z_attacking[zombie] = True
+                p_hp[plant] -= game.CONTACT_DAMAGE  # 植物に継続的ダメージ
+                if p_hp[plant] <= 0:  # 植物が倒れた場合
+                    p_alive[plant] = False
+                    self.z_attacking[zombie] = False
+                    break
+            if not self.z_attacking[zombie]:
+                self.z_speed[zombie] = self.z_initial_speed[zombie]
+
+    def _move_zombies(self):
+        """ゾンビを動かし、陣地に入ったものを判定する"""
+        moving = self.z_alive & ~self.z_attacking
+        self.z_x[moving] -= self.z_speed[moving]
+        self.z_speed[self.z_alive & self.z_attacking] = 0  # 攻撃中は止まる
+        breached = self.z_alive & (self.z_x < game.GRID_OFFSET_X)
+        if breached.any():
+            if self.rules.lose_on_breach:
+                self.game_over = True
+            else:
+                self.breaches += int(breached.sum())
+                self.z_alive &= ~breached
+
+    def _compact(self):
+        """倒されたゾンビ・植物と使い終わった弾を順番を保ったまま取り除く"""
+        if not self.z_alive.all():
+            keep = self.z_alive
+            self.z_x, self.z_lane, self.z_hp = self.z_x[keep], self.z_lane[keep], self.z_hp[keep]
+            self.z_speed, self.z_initial_speed = self.z_speed[keep], self.z_initial_speed[keep]
+            self.z_kind, self.z_attacking = self.z_kind[keep], self.z_attacking[keep]
+            self.z_alive = self.z_alive[keep]
+        if not self.p_alive.all():
+            keep = self.p_alive
+            self.p_x, self.p_lane, self.p_hp = self.p_x[keep], self.p_lane[keep], self.p_hp[keep]
+            self.p_kind, self.p_shooter = self.p_kind[keep], self.p_shooter[keep]
+            self.p_last_shot = self.p_last_shot[keep]
+            self.p_alive = self.p_alive[keep]
+            # 番号が詰まったのでマスごとの植物の番号を付け直す
+            self.cell_plant.fill(-1)
+            self.cell_plant[self.p_lane, (self.p_x - game.GRID_OFFSET_X) // game.GRID_SIZE] = np.arange(len(self.p_x))
+        if not self.b_alive.all():
+            keep = self.b_alive
+            self.b_x, self.b_lane = self.b_x[keep], self.b_lane[keep]
+            self.b_alive = self.b_alive[keep]
+
+    def step(self):
+        """1ステップ（1フレーム分）ゲームを進める"""
+        if self.finished:
+            return
+        profiler = self.profiler
+        current_time = self.now
+        with profiler.phase("timers"):
+            self._tick_timers(current_time)
+        with profiler.phase("shoot"):
+            self._shoot(current_time)
+        with profiler.phase("bullets"):
+            self._move_bullets()
+        with profiler.phase("contact"):
+            self._contact()
+        with profiler.phase("zombies"):
+            self._move_zombies()
+        clear_score = self.rules.clear_score
+        if clear_score is not None and self.score >= clear_score:
+            self.cleared = True
+        with profiler.phase("sweep"):
+            self._compact()
+        self.clock.advance()
+
+    def run(self, max_ticks):
+        """ゲームが終わるかmax_ticksステップ進むまで進める"""
+        for _ in range(max_ticks):
+            if self.finished:
+                break
+            self.step()
+        return self
@@ -0,0 +1,208 @@
+"""
+難易度調整のためにウィンドウなしのゲームを大量に並列実行するツール
+
+使い方：
+    python batch_runner.py --games 1000 --spawn-interval 5000,3000 --bullet-damage 5,10
+    python batch_runner.py --weights 51/25/25,30/35/35 --output sweep.json
+
+パラメータの組み合わせ（ゾンビの出現間隔・お金が増える間隔・弾のダメージ・
+ゾンビの出やすさ）ごとに、自動プレイヤーで--games回ずつ遊び、
+クリア率・生き残った時間・スコアの分布・1秒あたりのゲーム数をJSONで出力する。
+各ゲームのseedは--seedだけから決まり、どの組み合わせでも同じseedの列を使うので、
+コア数やプロセスの割り当てが変わっても同じ結果になる。
+"""
+import argparse
+import concurrent.futures
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # ワーカーごとの挨拶を出さない
+
+import KokatonVSZombie as game
+from scripted_player import ScriptedPlayer
+
+DEFAULT_MAX_SECONDS = 600  # 1ゲームの最大の長さ（シミュレーション内の秒）
+TASKS_PER_WORKER = 4  # 1プロセスあたりに割り当てるワーカー呼び出しの数（終わる時間のばらつきをならす）
+
+
+def parse_list(text, convert=float):
+    """カンマ区切りの値をリストにする（整数になるものは整数にする）"""
+    values = []
+    for item in text.split(","):
+        value = convert(item)
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        values.append(value)
+    return values
+
+
+def parse_weights(text):
+    """"51/25/25"のような出やすさをRules.zombie_weightsの形にする"""
+    weights = tuple(int(w) for w in text.split("/"))
+    if len(weights) != len(game.ZOMBIE_KINDS):
+        raise argparse.ArgumentTypeError(f"ゾンビの出やすさは{len(game.ZOMBIE_KINDS)}個必要です: {text}")
+    return tuple(zip(game.ZOMBIE_KINDS, weights))
+
+
+def make_configs(spawn_intervals, money_intervals, bullet_damages, weights):
+    """パラメータの全組み合わせをRulesに渡す辞書のリストにする"""
+    configs = []
+    for spawn, money, damage, weight in itertools.product(spawn_intervals, money_intervals, bullet_damages, weights):
+        configs.append({
+            "zombie_spawn_interval": spawn,
+            "money_increase_interval": money,
+            "bullet_damage": damage,
+            "zombie_weights": weight,
+        })
+    return configs
+
+
+def game_seeds(seed, games):
+    """--seedから各ゲームのseedを決める"""
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(games)]
+
+
+def play_games(config, seeds, max_ticks):
+    """
+    ワーカーで実行する：configのルールでseedsのゲームを順に遊ぶ
+    戻り値：ゲームごとの(結果, 終わったステップ数, スコア)のリストとかかった秒数
+    """
+    start = time.perf_counter()
+    results = []
+    for seed in seeds:
+        sim = game.Simulation(seed, rules=game.Rules(**config))
+        ScriptedPlayer().play(sim, max_ticks)
+        outcome = "win" if sim.cleared else "lose" if sim.game_over else "timeout"
+        results.append((outcome, sim.ticks, sim.score))
+    return results, time.perf_counter() - start
+
+
+def _percentile(values, q):
+    """valuesのq%点（valuesは並べ替え済み）"""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def summarize(config, games, cpu_seconds):
+    """1つの組み合わせのゲーム結果を集計する"""
+    count = len(games)
+    outcomes = [outcome for outcome, _, _ in games]
+    survival = sorted(ticks * game.STEP_MS / 1000 for _, ticks, _ in games)
+    scores = sorted(score for _, _, score in games)
+    return {
+        "config": dict(config, zombie_weights=dict(config["zombie_weights"])),
+        "games": count,
+        "win_rate": outcomes.count("win") / count,
+        "lose_rate": outcomes.count("lose") / count,
+        "timeout_rate": outcomes.count("timeout") / count,
+        "survival_seconds": {
+            "mean": sum(survival) / count,
+            "p10": _percentile(survival, 10),
+            "p50": _percentile(survival, 50),
+            "p90": _percentile(survival, 90),
+        },
+        "score": {
+            "mean": sum(scores) / count,
+            "p10": _percentile(scores, 10),
+            "p50": _percentile(scores, 50),
+            "p90": _percentile(scores, 90),
+            "max": scores[-1],
+        },
+        "games_per_cpu_second": count / cpu_seconds if cpu_seconds else None,
+    }
+
+
+def chunk_size(total, workers):
+    """total個のゲームをworkers個のプロセスに配るときの、1回のワーカー呼び出しで遊ぶゲーム数"""
+    return max(1, math.ceil(total / (workers * TASKS_PER_WORKER)))
+
+
+def run_batch(configs, seeds, max_ticks, workers=None, chunk=None):
+    """
+    全組み合わせ×全seedのゲームをプロセスプールで実行する
+    chunkを省略すると、すべてのプロセスが最後まで働くようにゲーム数とプロセス数から決める
+    戻り値：組み合わせごとの集計のリストと、全体のかかった秒数
+    """
+    if chunk is None:
+        chunk = chunk_size(len(configs) * len(seeds), workers or os.cpu_count())
+    chunks = [(index, start) for index in range(len(configs)) for start in range(0, len(seeds), chunk)]
+    games = [[None] * len(seeds) for _ in configs]
+    cpu_seconds = [0.0] * len(configs)
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(play_games, configs[index], seeds[first:first + chunk], max_ticks): (index, first)
+            for index, first in chunks
+        }
+        for future in concurrent.futures.as_completed(futures):
+            index, first = futures[future]
+            results, seconds = future.result()
+            games[index][first:first + len(results)] = results  # 終わった順ではなくseedの順に並べる
+            cpu_seconds[index] += seconds
+    elapsed = time.perf_counter() - start
+    return [summarize(config, games[i], cpu_seconds[i]) for i, config in enumerate(configs)], elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=200, help="1つの組み合わせで遊ぶゲーム数")
+    parser.add_argument("--seed", type=int, default=0, help="全ゲームのseedを決めるseed")
+    parser.add_argument("--spawn-interval", default=str(game.zombie_spawn_interval),
+                        help="ゾンビの出現間隔（ミリ秒、カンマ区切り）")
+    parser.add_argument("--money-interval", default=str(game.money_increase_interval),
+                        help="お金が増える間隔（ミリ秒、カンマ区切り）")
+    parser.add_argument("--bullet-damage", default=str(game.BULLET_DAMAGE), help="弾のダメージ（カンマ区切り）")
+    parser.add_argument("--weights", default="/".join(str(w) for _, w in game.Rules().zombie_weights),
+                        help="normal/fast/tankの出やすさ（カンマ区切り、例：51/25/25,30/35/35）")
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS,
+                        help="1ゲームの最大の長さ（シミュレーション内の秒）")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPUのコア数）")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    configs = make_configs(parse_list(args.spawn_interval), parse_list(args.money_interval),
+                           parse_list(args.bullet_damage, int),
+                           [parse_weights(text) for text in args.weights.split(",")])
+    seeds = game_seeds(args.seed, args.games)
+    max_ticks = int(args.max_seconds * 1000 / game.STEP_MS)
+    workers = args.workers or os.cpu_count()
+    results, elapsed = run_batch(configs, seeds, max_ticks, workers)
+
+    for result in results:
+        config = result["config"]
+        print(f"spawn {config['zombie_spawn_interval']:>6} money {config['money_increase_interval']:>6} "
+              f"damage {config['bullet_damage']:>3} weights {'/'.join(map(str, config['zombie_weights'].values())):>9}: "
+              f"win {result['win_rate']:6.1%}, survival p50 {result['survival_seconds']['p50']:6.1f} s, "
+              f"score p50 {result['score']['p50']}", file=sys.stderr)
+    total = len(configs) * len(seeds)
+    print(f"{total} games in {elapsed:.1f} s ({total / elapsed:.0f} games/s, {workers} workers)", file=sys.stderr)
+
+    report = {
+        "seed": args.seed,
+        "games_per_config": args.games,
+        "max_seconds": args.max_seconds,
+        "workers": workers,
+        "python": platform.python_version(),
+        "games_per_second": total / elapsed,
+        "elapsed_seconds": elapsed,
+        "configs": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+ウィンドウなしで決まった盤面とゾンビの波を流し、処理時間を計測するベンチマーク
+
+使い方：
+    python benchmark.py --output result.json
+    python benchmark.py --baseline old.json  # 前回の結果と比べて遅くなった場面を表示
+
+盤面（5×9マスに攻撃こうかとんと守りこうかとんを並べたもの）ごとに、
+3種類のゾンビを決まった密度で出し続け、1ステップのシミュレーション時間、
+1フレームの描画時間と描画の呼び出し回数、達成できるFPS、最大のエンティティ数をJSONで出力する。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # ウィンドウを開かない
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import KokatonVSZombie as game
+
+# 盤面の並べ方：(行, 列) -> 植物の種類
+BOARDS = {
+    "shooters": lambda row, col: "shooter",
+    "walls": lambda row, col: "wall",
+    "checker": lambda row, col: "shooter" if (row + col) % 2 == 0 else "wall",
+    "front_walls": lambda row, col: "wall" if col >= game.GRID_COLUMNS - 2 else "shooter",
+}
+
+DEFAULT_DENSITIES = (1, 4, 16, 64)  # 1秒あたりに出すゾンビの数
+ZOMBIE_MIX = ("normal", "fast", "tank")
+
+
+def _percentile(values, q):
+    """valuesのq%点（valuesは並べ替え済み）"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def _summary_ms(samples):
+    """秒単位の計測値をミリ秒の平均・中央値・p95・p99・最大にまとめる"""
+    values = sorted(sample * 1000 for sample in samples)
+    if not values:
+        return None
+    return {
+        "mean": sum(values) / len(values),
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "p99": _percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+def make_simulation(backend, seed):
+    """ランダム出現を止めたエンドレスルールでシミュレーションを作る"""
+    rules = game.endless_rules(zombie_spawn_interval=float("inf"), zombies_per_spawn=0)
+    rules.initial_money = 10 ** 9  # 盤面を埋めるのに十分な所持金
+    if backend == "arrays":
+        import array_simulation
+        return array_simulation.ArraySimulation(seed, rules=rules)
+    return game.Simulation(seed, rules=rules)
+
+
+def fill_board(sim, board):
+    """5×9マスすべてに植物を置く"""
+    layout = BOARDS[board]
+    for row in range(game.GRID_ROWS):
+        for col in range(game.GRID_COLUMNS):
+            center = (game.GRID_OFFSET_X + col * game.GRID_SIZE + game.GRID_SIZE // 2,
+                      game.INFO_AREA_HEIGHT + row * game.GRID_SIZE + game.GRID_SIZE // 2)
+            sim.place(layout(row, col), center)
+
+
+def run_scenario(board, density, ticks, seed, backend, render):
+    """
+    1つの場面を実行して計測結果を返す
+    引数 density：1秒あたりに出すゾンビの数、ticks：進めるステップ数
+    """
+    sim = make_simulation(backend, seed)
+    fill_board(sim, board)
+    wave_rng = random.Random(seed)
+    renderer = game.Renderer(game.get_app().screen) if render else None
+    steps_per_second = 1000 / game.STEP_MS
+    owed = 0.0  # まだ出していないゾンビの数（小数）
+    sim_times = []
+    render_times = []
+    draw_calls = []
+    sprites = []
+    peak = {"zombies": 0, "plants": 0, "bullets": 0}
+    for _ in range(ticks):
+        owed += density / steps_per_second
+        while owed >= 1:
+            sim.spawn_zombie(wave_rng.choice(ZOMBIE_MIX), wave_rng.randrange(game.GRID_ROWS))
+            owed -= 1
+        start = time.perf_counter()
+        sim.step()
+        sim_times.append(time.perf_counter() - start)
+        if renderer is not None:
+            start = time.perf_counter()
+            renderer.begin_frame(sim.money, sim.score)
+            game.draw_entities(renderer, sim)
+            renderer.present()
+            render_times.append(time.perf_counter() - start)
+            draw_calls.append(renderer.frame_stats["draw_calls"])
+            sprites.append(renderer.frame_stats["sprites"])
+        for kind, count in sim.entity_counts().items():
+            peak[kind] = max(peak[kind], count)
+    frame_time = sum(sim_times) + sum(render_times)
+    return {
+        "board": board,
+        "zombies_per_second": density,
+        "ticks": len(sim_times),
+        "sim_ms_per_tick": _summary_ms(sim_times),
+        "render_ms_per_frame": _summary_ms(render_times),
+        "draw_calls_per_frame": max(draw_calls, default=None),
+        "sprites_per_frame": {"mean": sum(sprites) / len(sprites), "max": max(sprites)} if sprites else None,
+        "fps": len(sim_times) / frame_time if frame_time else None,
+        "peak_entities": peak,
+        "final_score": sim.score,
+        "breaches": sim.breaches,
+    }
+
+
+def scenario_key(result):
+    """結果を比べるときの場面の名前"""
+    return f"{result['board']}@{result['zombies_per_second']}"
+
+
+def compare(results, baseline, tolerance):
+    """
+    前回の結果と比べ、平均時間がtolerance倍より遅くなった場面を返す
+    戻り値：(場面名, 項目, 前回, 今回)のリスト
+    """
+    old = {scenario_key(result): result for result in baseline["scenarios"]}
+    regressions = []
+    for result in results:
+        before = old.get(scenario_key(result))
+        if before is None:
+            continue
+        for field in ("sim_ms_per_tick", "render_ms_per_frame"):
+            if result[field] and before.get(field):
+                if result[field]["mean"] > before[field]["mean"] * tolerance:
+                    regressions.append((scenario_key(result), field, before[field]["mean"], result[field]["mean"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boards", default=",".join(BOARDS), help="盤面の名前（カンマ区切り）")
+    parser.add_argument("--densities", default=",".join(map(str, DEFAULT_DENSITIES)),
+                        help="1秒あたりに出すゾンビの数（カンマ区切り）")
+    parser.add_argument("--ticks", type=int, default=1800, help="1場面あたりのステップ数（60で1秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=("objects", "arrays"), default="objects")
+    parser.add_argument("--no-render", action="store_true", help="描画時間を計測しない")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル（省略時は標準出力）")
+    parser.add_argument("--baseline", help="比較する前回の結果のJSONファイル")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="この倍率より遅くなったら失敗とする")
+    args = parser.parse_args(argv)
+
+    render = not args.no_render and args.backend == "objects"  # 配列版は描画に対応していない
+    results = []
+    for board in args.boards.split(","):
+        for density in args.densities.split(","):
+            density = float(density)
+            if density.is_integer():
+                density = int(density)
+            result = run_scenario(board, density, args.ticks, args.seed, args.backend, render)
+            results.append(result)
+            print(f"{scenario_key(result):>20}: sim {result['sim_ms_per_tick']['mean']:.3f} ms/tick, "
+                  f"fps {result['fps']:.0f}, peak zombies {result['peak_entities']['zombies']}", file=sys.stderr)
+    report = {
+        "backend": args.backend,
+        "seed": args.seed,
+        "ticks": args.ticks,
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "scenarios": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, field, before, after in regressions:
+            print(f"遅くなった: {name} {field} {before:.3f} -> {after:.3f} ms", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
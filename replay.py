@@ -0,0 +1,165 @@
+"""
+記録した操作（python KokatonVSZombie.py --record PATH）を再生するツール
+
+使い方：
+    python replay.py game.kvzr                      # ウィンドウを開いて実際の速さで再生
+    python replay.py game.kvzr --fast               # 描画せずに最大速度で再生し、最後の状態を確かめる
+    python replay.py game.kvzr --fast --timings new.json --compare old.json
+
+--fastでは記録の終わりまで進めたあと、盤面のハッシュを記録したときのものと比べ、
+違えば終了コード1を返す（ルールや処理の変更で結果が変わったことがわかる）。
+--timingsでステップごとの処理時間を書き出し、--compareで別のビルドの
+処理時間とステップごとに比べて、遅くなったステップを表示する。
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+import KokatonVSZombie as game
+
+DEFAULT_MAX_TICKS = 60 * 60 * 60  # 記録が途中で終わっているときに進める最大ステップ数（1時間）
+SLOWEST_TICKS = 10  # --compareで表示する遅くなったステップの数
+
+
+def replay_fast(log, max_ticks=DEFAULT_MAX_TICKS):
+    """
+    描画せずに最大速度で再生する
+    戻り値：(シミュレーション, ステップごとの処理時間（秒）のリスト)
+    """
+    sim = game.Simulation(log.seed)
+    pending = collections.deque(log.commands)
+    end = log.final_ticks if log.final_ticks is not None else max_ticks
+    tick_times = []
+    perf_counter = time.perf_counter
+    while True:
+        while pending and pending[0].tick <= sim.ticks:
+            command = pending.popleft()
+            game.apply_command(sim, command.command, command.pos)
+        if sim.finished or sim.ticks >= end:
+            break
+        start = perf_counter()
+        sim.step()
+        tick_times.append(perf_counter() - start)
+    return sim, tick_times
+
+
+def replay_realtime(log, max_ticks=DEFAULT_MAX_TICKS):
+    """ウィンドウを開いて記録したときと同じ速さで再生する"""
+    screen = game.get_app().screen
+    renderer = game.Renderer(screen)
+    sim = game.Simulation(log.seed)
+    pending = collections.deque(log.commands)
+    end = log.final_ticks if log.final_ticks is not None else max_ticks
+    loop = game.FixedStepLoop()
+    clock = pygame.time.Clock()
+
+    def step():
+        """そのステップの操作を反映してから1ステップ進める"""
+        while pending and pending[0].tick <= sim.ticks:
+            command = pending.popleft()
+            game.apply_command(sim, command.command, command.pos)
+        if sim.ticks < end:
+            sim.step()
+
+    while not sim.finished and sim.ticks < end:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return sim
+        if not loop.update(step):
+            continue
+        renderer.begin_frame(sim.money, sim.score)
+        game.draw_entities(renderer, sim, loop.alpha)
+        renderer.present()
+        clock.tick(60)
+    while pending:  # 最後のステップの後に行った操作
+        command = pending.popleft()
+        game.apply_command(sim, command.command, command.pos)
+    return sim
+
+
+def _percentile(values, q):
+    """valuesのq%点（valuesは並べ替え済み）"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def _summary_ms(tick_ms):
+    """ミリ秒の処理時間を平均・p50・p99・最大にまとめる"""
+    values = sorted(tick_ms)
+    return {
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": _percentile(values, 50),
+        "p99": _percentile(values, 99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+def compare_timings(before, after, slowest=SLOWEST_TICKS):
+    """
+    同じ記録を再生した2つのビルドの処理時間をステップごとに比べる
+    戻り値：全体の比較と、遅くなった量が大きいステップのリスト
+    """
+    if before["hash"] != after["hash"]:
+        print("注意：最後の状態が違うので、ステップごとの比較は参考値です", file=sys.stderr)
+    pairs = list(zip(before["tick_ms"], after["tick_ms"]))
+    slower = sorted(range(len(pairs)), key=lambda i: pairs[i][0] - pairs[i][1])[:slowest]
+    old, new = _summary_ms(before["tick_ms"]), _summary_ms(after["tick_ms"])
+    return {
+        "before": old,
+        "after": new,
+        "mean_ratio": new["mean"] / old["mean"] if old["mean"] else None,
+        "slower_ticks": [{"tick": i, "before_ms": pairs[i][0], "after_ms": pairs[i][1]} for i in slower],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", help="記録したファイル")
+    parser.add_argument("--fast", action="store_true", help="描画せずに最大速度で再生する")
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS,
+                        help="記録が途中で終わっているときに進める最大ステップ数")
+    parser.add_argument("--timings", help="ステップごとの処理時間を書き出すJSONファイル（--fastのとき）")
+    parser.add_argument("--compare", help="比べる前回の処理時間のJSONファイル（--fastのとき）")
+    args = parser.parse_args(argv)
+
+    log = game.read_input_log(args.log)
+    if not args.fast:
+        sim = replay_realtime(log, args.max_ticks)
+        print(f"{sim.ticks} ticks, score {sim.score}", file=sys.stderr)
+        pygame.quit()
+        return 0
+
+    start = time.perf_counter()
+    sim, tick_times = replay_fast(log, args.max_ticks)
+    elapsed = time.perf_counter() - start
+    digest = game.state_hash(sim)
+    print(f"{sim.ticks} ticks in {elapsed:.3f} s ({sim.ticks / elapsed if elapsed else 0:.0f} ticks/s), "
+          f"{len(log.commands)} commands, score {sim.score}, hash {digest.hex()[:16]}", file=sys.stderr)
+    status = 0
+    if log.final_hash is None:
+        print("記録が途中で終わっているので最後の状態は確かめられません", file=sys.stderr)
+    elif digest != log.final_hash:
+        print(f"最後の状態が記録と違います：記録 {log.final_hash.hex()[:16]}、再生 {digest.hex()[:16]}", file=sys.stderr)
+        status = 1
+
+    timings = {"log": args.log, "ticks": sim.ticks, "hash": digest.hex(), "tick_ms": [t * 1000 for t in tick_times]}
+    if args.timings:
+        with open(args.timings, "w", encoding="utf-8") as f:
+            json.dump(timings, f)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            result = compare_timings(json.load(f), timings)
+        print(json.dumps(result, indent=2))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+決まった手順でこうかとんを置く自動プレイヤー
+
+バッチ実行や長時間の連続実行で、人が遊ぶ代わりにSimulation
+（またはArraySimulation）を操作する。盤面はsnapshot()から読むので
+どちらのシミュレーションでも同じように動き、乱数を使わないので
+同じseedのゲームなら毎回同じ手を打つ。
+
+方針：
+1. ゾンビがいる行で、守りこうかとんがなければ一番前の植物の
+   1つ右（植物がなければWALL_COLUMN）に守りこうかとんを置く
+2. 残りのお金で、ゾンビが多い行・攻撃こうかとんが少ない行から順に、
+   守りこうかとんより左の空いているマスに攻撃こうかとんを置く
+"""
+import KokatonVSZombie as game
+
+THINK_INTERVAL = 250  # 盤面を見直す間隔（ミリ秒）
+WALL_COLUMN = game.GRID_COLUMNS - 3  # 植物がない行で守りこうかとんを置く列
+
+
+def cell_center(row, col):
+    """row行col列のマスの中心の座標"""
+    return (game.GRID_OFFSET_X + col * game.GRID_SIZE + game.GRID_SIZE // 2,
+            game.INFO_AREA_HEIGHT + row * game.GRID_SIZE + game.GRID_SIZE // 2)
+
+
+def cell_of(x, y):
+    """植物の左上の座標から(行, 列)を求める"""
+    return (y - game.INFO_AREA_HEIGHT) // game.GRID_SIZE, (x - game.GRID_OFFSET_X) // game.GRID_SIZE
+
+
+class ScriptedPlayer:
+    """
+    THINK_INTERVALごとに盤面を見て植物を置くプレイヤー
+    毎ステップact(sim)を呼び、その後でsim.step()を呼ぶ
+    """
+    def __init__(self, think_interval=THINK_INTERVAL, wall_column=WALL_COLUMN):
+        self.think_interval = think_interval
+        self.wall_column = wall_column
+        self.next_think = 0
+        self.placed = 0  # 置いた植物の数
+
+    def act(self, sim):
+        """考える時刻になっていれば植物を置く。戻り値：置いた植物の数"""
+        if sim.now < self.next_think:
+            return 0
+        self.next_think = sim.now + self.think_interval
+        state = sim.snapshot()
+        occupied = {}  # (行, 列) -> 植物のクラス名
+        for name, x, y, _, _ in state["plants"]:
+            occupied[cell_of(x, y)] = name
+        zombies = [0] * game.GRID_ROWS
+        for _, y, _, _ in state["zombies"]:
+            zombies[game.lane_of(y)] += 1
+
+        money = state["money"]
+        placed = 0
+        wall_cost = game.PLANT_KINDS["wall"][1]
+        shooter_cost = game.PLANT_KINDS["shooter"][1]
+        walls = {}  # 行 -> 守りこうかとんの列
+        for (row, col), name in occupied.items():
+            if name == "Plant_wall":
+                walls[row] = max(col, walls.get(row, -1))
+
+        # 1. ゾンビが来ている行を守りこうかとんでふさぐ
+        for row in sorted(range(game.GRID_ROWS), key=lambda r: -zombies[r]):
+            if zombies[row] == 0 or row in walls or money < wall_cost:
+                continue
+            front = max((col for r, col in occupied if r == row), default=None)
+            col = self.wall_column if front is None else min(front + 1, game.GRID_COLUMNS - 1)
+            if (row, col) in occupied:
+                continue
+            if sim.place("wall", cell_center(row, col)):
+                occupied[(row, col)] = "Plant_wall"
+                walls[row] = col
+                money -= wall_cost
+                placed += 1
+
+        # 2. 攻撃こうかとんを左から並べる
+        shooters = [0] * game.GRID_ROWS
+        for (row, _), name in occupied.items():
+            if name == "Plant":
+                shooters[row] += 1
+        while money >= shooter_cost:
+            free = None
+            for row in sorted(range(game.GRID_ROWS), key=lambda r: (-zombies[r], shooters[r], r)):
+                limit = walls.get(row, self.wall_column)
+                col = next((c for c in range(limit) if (row, c) not in occupied), None)
+                if col is not None:
+                    free = row, col
+                    break
+            if free is None or not sim.place("shooter", cell_center(*free)):
+                break
+            occupied[free] = "Plant"
+            shooters[free[0]] += 1
+            money -= shooter_cost
+            placed += 1
+        self.placed += placed
+        return placed
+
+    def play(self, sim, max_ticks):
+        """ゲームが終わるかmax_ticksステップ進むまで遊ぶ"""
+        for _ in range(max_ticks):
+            if sim.finished:
+                break
+            self.act(sim)
+            sim.step()
+        return sim
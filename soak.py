@@ -0,0 +1,238 @@
+"""
+ウィンドウなしで何時間分もゲームを続け、メモリやリストの長さが増え続けていないかを調べるツール
+
+使い方：
+    python soak.py --hours 2 --output soak.json
+    python soak.py --hours 0.5 --no-render --max-memory-growth 1
+
+自動プレイヤー（scripted_player.py）で、クリアもゲームオーバーもないルールのゲームを
+シミュレーション内の時間で--hours時間進める。--intervalごとに
+tracemallocのメモリ量、RSS、zombies・plants・bulletsのリストの長さ、
+キャッシュの大きさ、スコアのビット数、1フレームの時間を記録する。
+ウォームアップ後の最初の記録から最後の記録までの増え方が予算を超えたら、
+メモリが増えた場所（ファイルと行）を表示して終了コード1を返す。
+1フレームの時間は、植物を並べ終わった後のウォームアップ直後の1区間と比べる。
+エンドレスではスコアが倍々に増え続け、いずれ文字列にできなくなる（描画で落ちる）ので、
+スコアのビット数が予算を超えたらその時点で止めて予算超過として報告する。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # ウィンドウを開かない
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import KokatonVSZombie as game
+from scripted_player import ScriptedPlayer
+
+TOP_SITES = 10  # 表示するメモリが増えた場所の数
+# スコアのビット数の予算の初期値（intを文字列にできる4300桁≒14284ビットより十分小さくする）
+DEFAULT_MAX_SCORE_BITS = 12000
+
+
+def rss_bytes():
+    """このプロセスの今の常駐メモリ（RSS）。/procがなければ最大値で代用する"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentile(values, q):
+    """valuesのq%点（valuesは並べ替え済み）"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def take_snapshot():
+    """tracemallocのスナップショット（tracemalloc自身とこのツールの記録は除く）"""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+
+def frame_summary(frame_times):
+    """1フレームの時間（秒）のリストをミリ秒の平均・p99・最大にまとめる"""
+    times = sorted(t * 1000 for t in frame_times)
+    return {"mean": sum(times) / len(times) if times else 0.0,
+            "p99": _percentile(times, 99), "max": times[-1] if times else 0.0}
+
+
+def sample(sim, frame_ms):
+    """今の状態を1件の記録にする（frame_msはframe_summaryの結果）"""
+    counts = sim.entity_counts()
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "sim_seconds": sim.now / 1000,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "rss_bytes": rss_bytes(),
+        "lists": {"zombies": len(sim.zombies), "plants": len(sim.plants), "bullets": len(sim.bullets)},
+        "alive": counts,
+        "scheduler": len(sim.scheduler),
+        "bullet_pool": sim.bullet_pool.created,
+        "caches": {name: stats()["cached"] for name, stats in game.default_counter_sources().items()},
+        "score_bits": sim.score.bit_length(),
+        "frame_ms": frame_ms,
+    }
+
+
+def check_budgets(samples, args):
+    """
+    ウォームアップ後の最初と最後の記録を比べ、予算を超えた項目の説明のリストを返す
+    1フレームの時間だけは、ウォームアップ中の平均ではなくその次の1区間（2件目の記録）と比べる
+    """
+    first, last = samples[0], samples[-1]
+    steady = samples[1] if len(samples) > 1 else first
+    failures = []
+    mib = 1024 * 1024
+    growth = (last["traced_bytes"] - first["traced_bytes"]) / mib
+    if growth > args.max_memory_growth:
+        failures.append(f"tracemallocのメモリが{growth:.2f} MiB増えた（予算 {args.max_memory_growth} MiB）")
+    growth = (last["rss_bytes"] - first["rss_bytes"]) / mib
+    if growth > args.max_rss_growth:
+        failures.append(f"RSSが{growth:.2f} MiB増えた（予算 {args.max_rss_growth} MiB）")
+    for name, length in last["lists"].items():
+        if length > args.max_list_length:
+            failures.append(f"{name}のリストが{length}件（予算 {args.max_list_length}件）")
+    if last["scheduler"] > args.max_list_length:
+        failures.append(f"Schedulerの予定が{last['scheduler']}件（予算 {args.max_list_length}件）")
+    before, after = steady["frame_ms"]["mean"], last["frame_ms"]["mean"]
+    if before and after / before > args.max_frame_growth:
+        failures.append(f"1フレームの平均時間が{before:.3f} msから{after:.3f} msに増えた（予算 {args.max_frame_growth}倍）")
+    if last["score_bits"] > args.max_score_bits:
+        failures.append(f"スコアが{last['score_bits']}ビットになり{last['sim_seconds'] / 60:.1f}分で止めた"
+                        f"（予算 {args.max_score_bits}ビット）")
+    return failures
+
+
+def grown_sites(baseline, snapshot, limit=TOP_SITES):
+    """baselineからメモリが増えた場所（ファイル:行）を増えた量の多い順に返す"""
+    sites = []
+    for stat in snapshot.compare_to(baseline, "lineno")[:limit]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[0]
+        sites.append({"site": f"{frame.filename}:{frame.lineno}", "size_diff": stat.size_diff,
+                      "count_diff": stat.count_diff})
+    return sites
+
+
+def run_soak(args):
+    """
+    ゲームを進めながら記録を取る
+    戻り値：(記録のリスト, ウォームアップ直後のスナップショット, 最後のスナップショット)
+    """
+    rules = game.Rules(clear_score=None, lose_on_breach=False)
+    sim = game.Simulation(args.seed, rules=rules)
+    player = ScriptedPlayer()
+    renderer = None if args.no_render else game.Renderer(game.get_app().screen)
+    interval_ticks = int(args.interval * 1000 / game.STEP_MS)
+    warmup_ticks = int(args.warmup * 1000 / game.STEP_MS)
+    total_ticks = warmup_ticks + int(args.hours * 3600 * 1000 / game.STEP_MS)
+    samples = []
+    baseline = None
+    frame_times = []
+    perf_counter = time.perf_counter
+
+    def record():
+        """記録を1件取って進み具合を表示する"""
+        frame_ms = frame_summary(frame_times)
+        frame_times.clear()  # 時間のリスト自体がメモリの増加に見えないよう、測る前に空にする
+        entry = sample(sim, frame_ms)
+        samples.append(entry)
+        print(f"{entry['sim_seconds'] / 60:8.1f} min: traced {entry['traced_bytes'] / 1024:8.0f} KiB, "
+              f"rss {entry['rss_bytes'] / 1024 / 1024:6.1f} MiB, lists {entry['lists']}, "
+              f"frame {entry['frame_ms']['mean']:.3f} ms", file=sys.stderr)
+
+    for tick in range(1, total_ticks + 1):
+        start = perf_counter()
+        player.act(sim)
+        sim.step()
+        if sim.score.bit_length() > args.max_score_bits:  # 描画で落ちる前に止める
+            if baseline is None:
+                baseline = take_snapshot()
+            record()
+            break
+        if renderer is not None:
+            renderer.begin_frame(sim.money, sim.score)
+            game.draw_entities(renderer, sim)
+            renderer.present()
+        frame_times.append(perf_counter() - start)
+        if tick == warmup_ticks or (tick > warmup_ticks and (tick - warmup_ticks) % interval_ticks == 0):
+            if baseline is None:
+                # キャッシュが埋まった後を基準にする（スナップショット自体のメモリも全記録に含まれるよう先に取る）
+                baseline = take_snapshot()
+            record()
+    return samples, baseline, take_snapshot()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=1.0, help="進めるシミュレーション内の時間（時間）")
+    parser.add_argument("--interval", type=float, default=60.0, help="記録を取る間隔（シミュレーション内の秒）")
+    parser.add_argument("--warmup", type=float, default=60.0,
+                        help="比較の基準にする最初の記録までの時間（シミュレーション内の秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-render", action="store_true", help="描画しない（シミュレーションだけを調べる）")
+    parser.add_argument("--trace-frames", type=int, default=1, help="tracemallocで記録する呼び出し元の深さ")
+    parser.add_argument("--max-memory-growth", type=float, default=4.0, help="tracemallocのメモリの増加の予算（MiB）")
+    parser.add_argument("--max-rss-growth", type=float, default=32.0, help="RSSの増加の予算（MiB）")
+    parser.add_argument("--max-list-length", type=int, default=2000,
+                        help="zombies・plants・bulletsのリストとSchedulerの予定の件数の予算")
+    parser.add_argument("--max-frame-growth", type=float, default=1.5,
+                        help="1フレームの平均時間の増加の予算（ウォームアップ直後の1区間に対する倍率）")
+    parser.add_argument("--max-score-bits", type=int, default=DEFAULT_MAX_SCORE_BITS,
+                        help="スコアのビット数の予算（超えたらその時点で止める）")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    tracemalloc.start(args.trace_frames)
+    samples, baseline, final = run_soak(args)
+    tracemalloc.stop()
+    failures = check_budgets(samples, args) if samples else []
+    report = {
+        "hours": args.hours,
+        "seed": args.seed,
+        "render": not args.no_render,
+        "python": platform.python_version(),
+        "budgets": {
+            "max_memory_growth_mib": args.max_memory_growth,
+            "max_rss_growth_mib": args.max_rss_growth,
+            "max_list_length": args.max_list_length,
+            "max_frame_growth": args.max_frame_growth,
+            "max_score_bits": args.max_score_bits,
+        },
+        "failures": failures,
+        "grown_sites": grown_sites(baseline, final),
+        "samples": samples,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for failure in failures:
+        print(f"予算超過: {failure}", file=sys.stderr)
+    if failures:
+        print("メモリが増えた場所:", file=sys.stderr)
+        for site in report["grown_sites"]:
+            print(f"  {site['site']}: +{site['size_diff'] / 1024:.1f} KiB ({site['count_diff']:+d} blocks)",
+                  file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
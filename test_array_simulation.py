@@ -0,0 +1,74 @@
+"""
+ArraySimulation（NumPy版）とSimulationが同じseedで同じ結果になるかを確かめるテスト
+
+使い方：
+    python -m pytest -q
+"""
+import os
+import random
+
+import pytest
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+pytest.importorskip("numpy")
+
+import KokatonVSZombie as game
+from array_simulation import ArraySimulation
+from scripted_player import ScriptedPlayer
+
+SEEDS = (0, 1, 2)
+TICKS = 6000  # 1ゲームで比べる最大ステップ数（100秒）
+
+RULES = {
+    "default": game.Rules,
+    "waves": lambda: game.Rules(zombie_spawn_interval=4000,
+                                waves=(game.Wave(20000, "fast", 3), game.Wave(40000, "tank", 2, 1))),
+    "endless": lambda: game.endless_rules(500, 3),
+}
+
+
+def run_both(seed, rules, act, ticks=TICKS):
+    """2つのシミュレーションを毎ステップ同じ操作で進め、snapshot()が最初に違ったステップを返す（同じならNone）"""
+    sims = [game.Simulation(seed, rules=rules()), ArraySimulation(seed, rules=rules())]
+    actors = [act(), act()]
+    for tick in range(ticks):
+        if sims[0].finished:
+            break
+        for sim, actor in zip(sims, actors):
+            actor(sim)
+            sim.step()
+        if sims[0].snapshot() != sims[1].snapshot():
+            return tick
+    return None
+
+
+def scripted():
+    """自動プレイヤーの操作"""
+    return ScriptedPlayer().act
+
+
+def random_edits(seed):
+    """ランダムな位置への設置とscopの操作（盤面の外や埋まったマスも含む）"""
+    def make():
+        rng = random.Random(seed)
+
+        def act(sim):
+            if rng.random() < 0.02:
+                sim.place(rng.choice(("shooter", "wall")), (rng.randint(0, game.SCREEN_WIDTH), rng.randint(0, game.SCREEN_HEIGHT)))
+            if rng.random() < 0.005:
+                sim.dig((rng.randint(0, game.SCREEN_WIDTH), rng.randint(0, game.SCREEN_HEIGHT)))
+        return act
+    return make
+
+
+@pytest.mark.parametrize("name", RULES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_scripted_games_match(seed, name):
+    assert run_both(seed, RULES[name], scripted) is None
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_random_place_and_dig_match(seed):
+    rules = lambda: game.endless_rules(1000, 2)
+    assert run_both(seed, rules, random_edits(seed)) is None
@@ -0,0 +1,79 @@
+"""
+Schedulerで動くmoneyの増加・ゾンビの出現・発射が、毎ステップ時刻を調べていたときと同じになるかを確かめるテスト
+
+使い方：
+    python -m pytest -q
+"""
+import os
+
+import pytest
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import KokatonVSZombie as game
+from scripted_player import ScriptedPlayer
+
+# 0、1ステップより短い間隔、ちょうど1ステップ、ふつうの間隔
+INTERVALS = (0, 5, game.STEP_MS / 2, game.STEP_MS, 1000)
+TICKS = 600  # 1ゲームで比べるステップ数（10秒）
+
+
+def polled_tick(clock, since, interval):
+    """毎ステップ「現在時刻 - since >= interval」を調べたときに最初に成り立つステップ数"""
+    tick = clock.ticks
+    while tick * clock.dt - since < interval:
+        tick += 1
+    return tick
+
+
+@pytest.mark.parametrize("interval", INTERVALS + (2000, 7 * game.STEP_MS + 1))
+@pytest.mark.parametrize("ticks", (0, 1, 59, 600))
+def test_due_tick_matches_polling(ticks, interval):
+    clock = game.SimClock()
+    clock.ticks = ticks
+    for since in (0, clock.now(), clock.now() - 3 * clock.dt, clock.now() - 1):
+        assert game.due_tick(clock, since, interval) == polled_tick(clock, since, interval)
+
+
+def test_scheduler_pops_due_events_in_order():
+    scheduler = game.Scheduler()
+    scheduler.schedule(3, game.TIMER_SHOOT, 2, "b")
+    scheduler.schedule(3, game.TIMER_SHOOT, 1, "a")
+    scheduler.schedule(3, game.TIMER_MONEY, 0, "money")
+    scheduler.schedule(4, game.TIMER_MONEY, 0, "later")
+    assert scheduler.pop_due(3, game.TIMER_WAVE) == ["money"]
+    assert scheduler.pop_due(3, game.TIMER_SHOOT) == ["a", "b"]
+    assert len(scheduler) == 1
+
+
+def polled_count(interval, ticks):
+    """毎ステップ時刻を調べたときに、ticksステップの間に出来事が起きる回数"""
+    count = last = 0
+    for tick in range(ticks):
+        if tick * game.STEP_MS - last >= interval:
+            count += 1
+            last = tick * game.STEP_MS
+    return count
+
+
+@pytest.mark.parametrize("interval", INTERVALS)
+def test_money_increases_like_polling(interval):
+    """間隔が0や1ステップより短くても、1ステップに1回までmoneyが増える"""
+    rules = game.Rules(money_increase_interval=interval, zombies_per_spawn=0, clear_score=None, lose_on_breach=False)
+    sim = game.Simulation(0, rules=rules)
+    sim.run(TICKS)
+    assert sim.money == rules.initial_money + polled_count(interval, TICKS) * rules.money_increase_amount
+
+
+@pytest.mark.parametrize("interval", INTERVALS)
+def test_short_intervals_match_array_backend(interval):
+    array_simulation = pytest.importorskip("array_simulation")
+    rules = lambda: game.Rules(money_increase_interval=interval, zombie_spawn_interval=interval,
+                               clear_score=None, lose_on_breach=False)
+    sims = [game.Simulation(1, rules=rules()), array_simulation.ArraySimulation(1, rules=rules())]
+    players = [ScriptedPlayer(), ScriptedPlayer()]
+    for _ in range(TICKS):
+        for sim, player in zip(sims, players):
+            player.act(sim)
+            sim.step()
+        assert sims[0].snapshot() == sims[1].snapshot()